@@ -0,0 +1,112 @@
+"""Persistent, content-addressed cache for OCR results.
+
+Entries are JSON files under a shared directory, so every browser session and
+worker process on the host sees the same cache. A file's mtime records when it
+was written (for the TTL) and its atime when it was last read (for LRU
+eviction once the directory grows past its size budget).
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from constants import OCR_CACHE_DIR, OCR_CACHE_MAX_BYTES, OCR_CACHE_TTL_SECONDS
+
+
+class DiskCache:
+    """Size-bounded, TTL-limited JSON cache on disk, safe to share across processes."""
+
+    def __init__(self, root, max_bytes, ttl_seconds=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._unchecked_bytes = 0
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def _expired(self, mtime, now):
+        return bool(self.ttl_seconds) and now - mtime > self.ttl_seconds
+
+    def get(self, key):
+        """Return the cached value for ``key``, or None on a miss or expired entry."""
+        path = self._path(key)
+        now = time.time()
+        try:
+            stat = os.stat(path)
+            if self._expired(stat.st_mtime, now):
+                os.remove(path)
+                return None
+            with open(path, encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path, (now, stat.st_mtime))
+            return value
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable cache entry {path}: {e}")
+            return None
+
+    def set(self, key, value):
+        """Store ``value`` under ``key`` and evict least recently used entries if needed.
+
+        The directory is only rescanned once writes since the last scan add up to
+        1/64 of the budget, so bursts of small per-page entries stay cheap.
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+            self._unchecked_bytes += os.path.getsize(path)
+        except OSError as e:
+            logging.warning(f"Could not write cache entry {path}: {e}")
+            return
+        if self._unchecked_bytes >= self.max_bytes // 64:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones until under ``max_bytes``."""
+        self._unchecked_bytes = 0
+        now = time.time()
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if not filename.endswith(".json"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                    if self._expired(stat.st_mtime, now):
+                        os.remove(path)
+                        continue
+                except FileNotFoundError:
+                    continue  # removed by another process
+                entries.append((stat.st_atime, stat.st_size, path))
+                total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+_result_cache = None
+
+
+def get_result_cache():
+    """Return the process-wide OCR result cache."""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = DiskCache(OCR_CACHE_DIR, OCR_CACHE_MAX_BYTES, OCR_CACHE_TTL_SECONDS)
+    return _result_cache
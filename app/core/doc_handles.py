@@ -0,0 +1,124 @@
+"""Process-wide cache of open PyMuPDF documents.
+
+Preview, page counting, routing, rendering and visualization all need the same
+upload as a ``fitz.Document``. :func:`open_document` parses each upload once
+per process and hands out the open document keyed by content hash. Callers
+that already know the hash pass it as ``doc_key`` so the bytes are not hashed
+again on every call. Documents
+are evicted least recently used first once their estimated memory footprint
+exceeds the budget.
+
+MuPDF documents must not be used from two threads at once, so each handle has
+its own (re-entrant) lock held for the duration of the ``with`` block. Callers
+keep that block to the page work itself; anything that waits, such as OCR of
+a rendered page, happens outside it. Parsing runs outside the cache lock, so a
+large upload being opened does not stall lookups of other documents.
+"""
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import fitz
+
+from app.core.pipeline import document_key
+from constants import DOCUMENT_HANDLE_CACHE_BYTES
+
+# Parsed documents keep the source buffer plus object tables and page trees;
+# twice the file size is a fair estimate of what an open handle costs.
+_FOOTPRINT_FACTOR = 2
+
+
+class _Handle:
+    def __init__(self, document, footprint):
+        self.document = document
+        self.footprint = footprint
+        self.lock = threading.RLock()
+        self.users = 0
+        self.evicted = False
+
+    def release(self):
+        """Close an evicted document once nobody uses it; call with ``lock`` held."""
+        if self.evicted and not self.users and not self.document.is_closed:
+            self.document.close()
+
+
+class DocumentHandles:
+    """LRU of open documents bounded by estimated memory, safe to share between threads."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._handles = OrderedDict()
+        self._footprint = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def open(self, file_bytes, filetype="pdf", doc_key=None):
+        """Yield the open document for ``file_bytes``, parsing it on first use.
+
+        ``doc_key`` is ``document_key(file_bytes)``, when the caller has it.
+        """
+        key = (doc_key or document_key(file_bytes), filetype)
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is not None:
+                self._handles.move_to_end(key)
+        if handle is None:
+            handle = self._insert(key, fitz.open(stream=file_bytes, filetype=filetype),
+                                  len(file_bytes) * _FOOTPRINT_FACTOR)
+
+        with handle.lock:
+            if handle.document.is_closed:
+                # Evicted and closed between lookup and use; fall back to a private copy
+                with fitz.open(stream=file_bytes, filetype=filetype) as document:
+                    yield document
+                return
+            handle.users += 1
+            try:
+                yield handle.document
+            finally:
+                handle.users -= 1
+                handle.release()
+
+    def _insert(self, key, document, footprint):
+        """Cache a freshly parsed document, unless another thread cached the same one first."""
+        evicted = []
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is None:
+                handle = _Handle(document, footprint)
+                document = None
+                self._handles[key] = handle
+                self._footprint += handle.footprint
+                while self._footprint > self.max_bytes and len(self._handles) > 1:
+                    _, old = self._handles.popitem(last=False)
+                    self._footprint -= old.footprint
+                    old.evicted = True
+                    evicted.append(old)
+            else:
+                self._handles.move_to_end(key)
+
+        # Close outside the cache lock; documents still in use close on release
+        if document is not None:
+            document.close()
+        for old in evicted:
+            with old.lock:
+                old.release()
+        return handle
+
+    def clear(self):
+        with self._lock:
+            handles = list(self._handles.values())
+            self._handles.clear()
+            self._footprint = 0
+        for handle in handles:
+            with handle.lock:
+                handle.evicted = True
+                handle.release()
+
+
+_handles = DocumentHandles(DOCUMENT_HANDLE_CACHE_BYTES)
+
+
+def open_document(file_bytes, filetype="pdf", doc_key=None):
+    """Context manager yielding the shared open document for ``file_bytes``."""
+    return _handles.open(file_bytes, filetype, doc_key)
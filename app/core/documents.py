@@ -0,0 +1,183 @@
+"""Streamlit-free document helpers shared by the OCR engine and the UI.
+
+Everything here takes bytes and returns plain data or raises, so it can run in
+worker processes; utils.py wraps these with Streamlit error reporting.
+"""
+import base64
+import hashlib
+import io
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz
+from PIL import Image
+
+from app.core.doc_handles import open_document
+from app.core.image_store import get_image_store
+from app.core.pipeline import document_key
+from constants import IMAGE_WRITE_WORKERS
+
+
+# Image types cloud providers accept inline as they are.
+INLINE_IMAGE_TYPES = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.webp': 'image/webp',
+}
+
+
+def inline_image_type(file_name):
+    """MIME type for an image that can be sent inline unchanged, else None."""
+    return INLINE_IMAGE_TYPES.get(os.path.splitext(file_name)[1].lower())
+
+
+def data_url(file_bytes, mime_type):
+    """Return ``file_bytes`` as a base64 ``data:`` URL."""
+    return f"data:{mime_type};base64,{base64.b64encode(file_bytes).decode('ascii')}"
+
+
+def prepare_file_for_mistral(file_bytes, file_name):
+    """Prepare file for Mistral OCR by converting if needed"""
+    if file_name.lower().endswith(('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.tiff')):
+        image = Image.open(io.BytesIO(file_bytes))
+        if image.mode in ('RGBA', 'LA'):
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.split()[-1])
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        pdf_bytes = io.BytesIO()
+        image.save(pdf_bytes, format='PDF', resolution=300.0)
+        return pdf_bytes.getvalue(), f"{os.path.splitext(file_name)[0]}.pdf"
+
+    return file_bytes, file_name
+
+
+def pdf_page_count(file_bytes, doc_key=None):
+    """Return the number of pages in a PDF."""
+    with open_document(file_bytes, doc_key=doc_key) as pdf:
+        return len(pdf)
+
+
+_COLORSPACES = {
+    "rgb": ("RGB", fitz.csRGB),
+    "gray": ("L", fitz.csGRAY),
+}
+
+
+def iter_pdf_pages(file_bytes, start_page=None, end_page=None, dpi=72, colorspace="rgb", pages=None):
+    """Yield PDF pages as PIL images, rendering one page at a time.
+
+    Pixmap samples are handed to PIL directly instead of going through a PNG
+    encode/decode round-trip, so only the page being rendered is held in memory.
+    ``pages`` optionally lists the 0-based pages to render instead of a range.
+    The shared document is only locked while a page renders, not while the
+    caller works on the image, so other threads can use it in between.
+    """
+    mode, fitz_colorspace = _COLORSPACES[colorspace]
+    doc_key = document_key(file_bytes)
+    if pages is None:
+        page_count = pdf_page_count(file_bytes, doc_key)
+        start = start_page - 1 if start_page else 0
+        end = min(end_page, page_count) if end_page else page_count
+        pages = range(start, end)
+
+    for page_num in pages:
+        with open_document(file_bytes, doc_key=doc_key) as pdf_document:
+            pix = pdf_document[page_num].get_pixmap(dpi=dpi, colorspace=fitz_colorspace, alpha=False)
+            samples = getattr(pix, "samples_mv", None) or pix.samples
+            image = Image.frombytes(mode, (pix.width, pix.height), samples)
+            del pix
+        yield image
+
+
+def page_fingerprints(file_bytes, start=0, end=None):
+    """Return a SHA-256 hex digest per page identifying what the page shows.
+
+    The digest covers the page geometry, its content stream and the raw streams
+    of every image and form XObject it draws, so a revised PDF yields the same
+    fingerprint for every page that did not change, without rendering anything.
+    """
+    with open_document(file_bytes) as pdf_document:
+        end = len(pdf_document) if end is None else min(end, len(pdf_document))
+        fingerprints = []
+        for page_num in range(start, end):
+            page = pdf_document[page_num]
+            digest = hashlib.sha256(f"{tuple(page.rect)}:{page.rotation}".encode())
+            digest.update(page.read_contents())
+            xrefs = [img[0] for img in page.get_images(full=True)] + [xobj[0] for xobj in page.get_xobjects()]
+            for xref in xrefs:
+                digest.update(pdf_document.xref_stream_raw(xref) or b"")
+            for font in page.get_fonts():
+                digest.update(str(font[3]).encode())
+            fingerprints.append(digest.hexdigest())
+        return fingerprints
+
+
+def extract_ocr_pages(response_dict, page_offset=0, store=None, max_workers=IMAGE_WRITE_WORKERS):
+    """Split a Mistral OCR response into per-page markdown and store its images.
+
+    Returns ``(pages, location, image_keys)`` where ``pages`` maps each page
+    index to its markdown in page order, ``location`` names the image store and
+    ``image_keys`` lists the distinct stored images. Page indices come from
+    each page's ``index`` field when present, falling back to counting from
+    ``page_offset``. Images are decoded and stored (``store`` defaults to the
+    shared :func:`get_image_store`) on a thread pool while the response is
+    walked; each page's image references are then rewritten in one pass.
+    """
+    store = store or get_image_store()
+    contents = {}
+    pending = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for position, page in enumerate(response_dict.get('pages', []), start=page_offset):
+            page_idx = page.get('index', position)
+            contents[page_idx] = page.get('markdown', '')
+            page_images = page.get('images', [])
+            if page_images:
+                logging.info(f"Found {len(page_images)} images in page {page_idx + 1}")
+            pending[page_idx] = [
+                (image['id'], executor.submit(store_image, image, store))
+                for image in page_images
+                if image.get('id') and image.get('image_base64')
+            ]
+
+    pages = {}
+    image_keys = {}
+    for page_idx, content in contents.items():
+        paths = {}
+        for image_id, future in pending[page_idx]:
+            key = future.result()
+            if key:
+                paths[image_id] = store.url(key)
+                image_keys[key] = None
+        pages[page_idx] = _link_images(content, paths) if paths else content
+    return pages, store.location, list(image_keys)
+
+
+_IMAGE_REF = re.compile(r'!\[([^\]\n]*)\]\(([^)\n]*)\)')
+
+
+def _link_images(markdown, paths):
+    """Point ``![id](id)`` references at the saved files in a single pass."""
+    def replace(match):
+        image_id = match.group(1)
+        if image_id == match.group(2) and image_id in paths:
+            return f"![Image {image_id}]({paths[image_id]})"
+        return match.group(0)
+    return _IMAGE_REF.sub(replace, markdown)
+
+
+def store_image(image, store):
+    """Decode an OCR response image and put it in ``store``; returns its key or None."""
+    try:
+        image_base64 = image.get('image_base64', '')
+        if ',' in image_base64:
+            image_base64 = image_base64.split(',', 1)[1]
+        return store.put(base64.b64decode(image_base64), image.get('format', 'png'))
+    except Exception as e:
+        logging.error(f"Error saving image: {e}")
+        return None
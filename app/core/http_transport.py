@@ -0,0 +1,122 @@
+"""Pooled HTTP transport for cloud OCR providers.
+
+One :class:`HTTPTransport` per provider keeps a ``requests.Session`` with a
+connection pool (keep-alive across pages), retries 429/5xx responses and
+connection errors with jittered exponential backoff that honours
+``Retry-After``, and paces requests through a client-side token bucket so
+bursts of pages stay within the provider's quota.
+"""
+import email.utils
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, at most ``capacity`` banked."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def parse_retry_after(value):
+    """Return the delay in seconds from a ``Retry-After`` header, or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HTTPTransport:
+    """``requests.Session`` with pooling, retries with backoff and rate limiting."""
+
+    def __init__(self, pool_size=10, max_retries=4, backoff_base=1.0, backoff_max=30.0,
+                 requests_per_minute=None, burst=1, timeout=120):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.bucket = TokenBucket(requests_per_minute / 60, burst) if requests_per_minute else None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _backoff(self, attempt):
+        # "Full jitter": spreads retries from concurrent pages instead of syncing them
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def post(self, url, **kwargs):
+        """POST with retries; returns the final response (which may still be an error).
+
+        A file-like ``data`` body is rewound before every attempt.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        body = kwargs.get("data")
+        for attempt in range(self.max_retries + 1):
+            if self.bucket:
+                self.bucket.acquire()
+            if hasattr(body, "seek"):
+                body.seek(0)
+            try:
+                response = self.session.post(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logging.warning(f"POST {url} failed ({e}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            delay = min(retry_after, self.backoff_max * 4) if retry_after is not None else self._backoff(attempt)
+            logging.warning(f"POST {url} returned {response.status_code}; "
+                            f"retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+            response.close()
+            time.sleep(delay)
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(name, settings):
+    """Return the shared transport for ``name``, created from ``settings`` on first use."""
+    key = (name, tuple(sorted(settings.items())))
+    with _transports_lock:
+        if key not in _transports:
+            _transports[key] = HTTPTransport(**settings)
+        return _transports[key]
@@ -0,0 +1,112 @@
+"""Image request payloads that encode each page exactly once.
+
+A page image is encoded once, in the format and size the endpoint needs. The
+JSON request body is then assembled from three byte segments (the JSON before
+the image, the base64 image, the JSON after it) and streamed to the socket
+from those segments. It is never joined into one string, so a large scan is
+not held in memory as several megabyte-scale copies (PNG bytes, a base64
+``str``, an f-string, ``json.dumps`` output and its UTF-8 encoding).
+"""
+import base64
+import io
+import json
+
+from PIL import Image
+
+MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+_PLACEHOLDER = "@@IMAGE_BASE64@@"
+
+
+def encode_image(image, fmt="JPEG", quality=90, max_side=None):
+    """Encode a PIL image once; returns ``(bytes, mime_type)``.
+
+    Images whose longer side exceeds ``max_side`` are downscaled first.
+    """
+    if max_side and max(image.size) > max_side:
+        image = image.copy()
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    buffer = io.BytesIO()
+    options = {"quality": quality} if fmt in ("JPEG", "WEBP") else {"optimize": False}
+    image.save(buffer, format=fmt, **options)
+    return buffer.getvalue(), MIME_TYPES[fmt]
+
+
+def encode_file_image(file_bytes, fmt="JPEG", quality=90, max_side=None):
+    """Pass an uploaded image through untouched when the endpoint accepts it as is.
+
+    Only images in an unsupported format, or larger than ``max_side``, are
+    decoded and re-encoded.
+    """
+    image = Image.open(io.BytesIO(file_bytes))
+    if image.format in ("JPEG", "PNG") and not (max_side and max(image.size) > max_side):
+        return file_bytes, MIME_TYPES[image.format]
+    return encode_image(image, fmt, quality, max_side)
+
+
+class SegmentedBody:
+    """Read-only, seekable file-like request body over a list of byte segments.
+
+    ``requests`` sends objects with ``read`` and ``__len__`` as a streamed body
+    with a proper Content-Length; ``seek(0)`` lets retries resend it.
+    """
+
+    def __init__(self, segments):
+        self._segments = [memoryview(segment) for segment in segments]
+        self._length = sum(len(segment) for segment in self._segments)
+        self.seek(0)
+
+    def __len__(self):
+        return self._length
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=0):
+        if offset != 0 or whence != 0:
+            raise io.UnsupportedOperation("SegmentedBody can only be rewound")
+        self._index = 0
+        self._offset = 0
+        self._position = 0
+        return 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._length - self._position
+        chunks = []
+        while size > 0 and self._index < len(self._segments):
+            segment = self._segments[self._index]
+            chunk = segment[self._offset:self._offset + size]
+            chunks.append(chunk)
+            size -= len(chunk)
+            self._offset += len(chunk)
+            self._position += len(chunk)
+            if self._offset >= len(segment):
+                self._index += 1
+                self._offset = 0
+        return b"".join(chunks)
+
+
+def build_json_body(payload, image_bytes, mime_type, content_template='<img src="data:{mime};base64,{data}" />'):
+    """Return a :class:`SegmentedBody` for ``payload`` with the image embedded once.
+
+    ``payload`` may contain the marker string returned by :func:`image_content`
+    wherever the image content should go.
+    """
+    serialized = json.dumps(payload, separators=(",", ":"))
+    marker = json.dumps(_PLACEHOLDER)[1:-1]
+    head, tail = serialized.split(marker, 1)
+    head_content, tail_content = json.dumps(
+        content_template.format(mime=mime_type, data=_PLACEHOLDER))[1:-1].split(marker, 1)
+    return SegmentedBody([
+        (head + head_content).encode("utf-8"),
+        base64.b64encode(image_bytes),
+        (tail_content + tail).encode("utf-8"),
+    ])
+
+
+def image_content():
+    """Placeholder to put in a payload where :func:`build_json_body` inserts the image."""
+    return _PLACEHOLDER
@@ -0,0 +1,284 @@
+"""Content-addressed storage for images extracted from OCR responses.
+
+Images are stored under the SHA-256 of their bytes, so a logo repeated on every
+page, or the same figure in two uploads, is kept once. Names never depend on
+the uploaded file name, so users cannot collide either. Each store has a size
+quota enforced by a background sweep that drops the least recently stored or
+used images. Markdown that still links to an evicted image shows a broken
+image, so the quota should comfortably exceed the working set.
+
+:class:`LocalImageStore` keeps files in a shared directory on this host.
+:class:`S3ImageStore` talks to any S3-compatible client (``boto3`` or
+:class:`LocalS3Client`, a filesystem stand-in for development and tests), so
+workers on different hosts can share one store.
+"""
+import hashlib
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+from constants import IMAGE_STORE_DIR, IMAGE_STORE_MAX_BYTES, IMAGE_STORE_S3_BUCKET, IMAGE_STORE_S3_PREFIX
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "gif": "image/gif",
+}
+
+
+class ImageStore:
+    """Base class: content addressing, quota bookkeeping and background collection.
+
+    Subclasses implement ``_exists``, ``_write``, ``_touch``, ``get``,
+    ``delete``, ``entries`` and ``url``.
+    """
+
+    location = None
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self._unchecked_bytes = 0
+        self._collecting = threading.Lock()
+
+    @staticmethod
+    def key_for(data, ext):
+        return f"{hashlib.sha256(data).hexdigest()}.{ext.lower().lstrip('.')}"
+
+    def put(self, data, ext="png"):
+        """Store ``data`` unless an identical image is already stored; returns its key."""
+        key = self.key_for(data, ext)
+        if self._exists(key):
+            self._touch(key)
+            return key
+        self._write(key, data)
+        self._unchecked_bytes += len(data)
+        # Sweep once writes since the last sweep add up to 1/64 of the quota
+        if self.max_bytes and self._unchecked_bytes >= self.max_bytes // 64:
+            self.collect_in_background()
+        return key
+
+    def collect_in_background(self):
+        """Start :meth:`collect` on a daemon thread unless a sweep is already running."""
+        if not self._collecting.acquire(blocking=False):
+            return
+
+        def sweep():
+            try:
+                self.collect()
+            except Exception as e:
+                logging.warning(f"Image store sweep of {self.location} failed: {e}")
+            finally:
+                self._collecting.release()
+
+        threading.Thread(target=sweep, name="image-store-gc", daemon=True).start()
+
+    def collect(self):
+        """Delete least recently used images until the store is within ``max_bytes``."""
+        self._unchecked_bytes = 0
+        if not self.max_bytes:
+            return
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            self.delete(key)
+            total -= size
+
+
+class LocalImageStore(ImageStore):
+    """Images as files under ``root/<key[:2]>/<key>``; the atime records the last use."""
+
+    def __init__(self, root, max_bytes=None, url_prefix=None):
+        super().__init__(max_bytes)
+        self.root = root
+        self.location = root
+        if url_prefix is None:
+            relative = os.path.relpath(root)
+            url_prefix = root if relative.startswith("..") else f"./{relative}"
+        self.url_prefix = url_prefix.rstrip("/")
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def _touch(self, key):
+        try:
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            pass  # evicted meanwhile; the next put stores it again
+
+    def _write(self, key, data):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, key):
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def entries(self):
+        """Yield ``(last_used, size, key)`` for every stored image."""
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(dirpath, filename))
+                except FileNotFoundError:
+                    continue
+                yield max(stat.st_atime, stat.st_mtime), stat.st_size, filename
+
+    def url(self, key):
+        return f"{self.url_prefix}/{key[:2]}/{key}"
+
+
+def _is_missing(error):
+    response = getattr(error, "response", None) or {}
+    return response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+
+class S3ImageStore(ImageStore):
+    """Images as objects in an S3-compatible bucket, via a ``boto3``-style client.
+
+    Object stores have no access time, so eviction order is by upload time.
+    """
+
+    def __init__(self, client, bucket, prefix="", max_bytes=None, url_prefix=None):
+        super().__init__(max_bytes)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.location = f"s3://{bucket}/{prefix}"
+        self.url_prefix = (url_prefix or self.location).rstrip("/")
+
+    def _exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+            return True
+        except Exception as e:
+            if _is_missing(e):
+                return False
+            raise
+
+    def _touch(self, key):
+        pass
+
+    def _write(self, key, data):
+        content_type = CONTENT_TYPES.get(key.rsplit(".", 1)[-1], "application/octet-stream")
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data, ContentType=content_type)
+
+    def get(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)["Body"].read()
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+    def entries(self):
+        kwargs = {"Bucket": self.bucket, "Prefix": self.prefix}
+        while True:
+            page = self.client.list_objects_v2(**kwargs)
+            for item in page.get("Contents", []):
+                yield item["LastModified"].timestamp(), item["Size"], item["Key"][len(self.prefix):]
+            if not page.get("IsTruncated"):
+                return
+            kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+    def url(self, key):
+        return f"{self.url_prefix}/{key}"
+
+
+class _Body:
+    def __init__(self, data):
+        self._data = data
+
+    def read(self):
+        return self._data
+
+
+class _MissingObject(Exception):
+    def __init__(self, key):
+        super().__init__(f"No such key: {key}")
+        self.response = {"Error": {"Code": "NoSuchKey"}}
+
+
+class LocalS3Client:
+    """Filesystem stand-in for the subset of the S3 client API used by :class:`S3ImageStore`."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, *key.split("/"))
+
+    def head_object(self, Bucket, Key):
+        path = self._path(Bucket, Key)
+        if not os.path.isfile(path):
+            raise _MissingObject(Key)
+        return {"ContentLength": os.path.getsize(path)}
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(Body)
+        return {}
+
+    def get_object(self, Bucket, Key):
+        try:
+            with open(self._path(Bucket, Key), "rb") as f:
+                return {"Body": _Body(f.read())}
+        except FileNotFoundError:
+            raise _MissingObject(Key) from None
+
+    def delete_object(self, Bucket, Key):
+        try:
+            os.remove(self._path(Bucket, Key))
+        except FileNotFoundError:
+            pass
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix="", ContinuationToken=None):
+        bucket_root = os.path.join(self.root, Bucket)
+        contents = []
+        for dirpath, _, filenames in os.walk(bucket_root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                key = os.path.relpath(path, bucket_root).replace(os.sep, "/")
+                if key.startswith(Prefix):
+                    stat = os.stat(path)
+                    contents.append({"Key": key, "Size": stat.st_size,
+                                     "LastModified": datetime.fromtimestamp(stat.st_mtime, timezone.utc)})
+        return {"Contents": sorted(contents, key=lambda item: item["Key"]), "IsTruncated": False}
+
+
+_image_store = None
+_image_store_lock = threading.Lock()
+
+
+def get_image_store():
+    """Return the process-wide image store: S3 when a bucket is configured, else local."""
+    global _image_store
+    with _image_store_lock:
+        if _image_store is None:
+            if IMAGE_STORE_S3_BUCKET:
+                import boto3
+                _image_store = S3ImageStore(boto3.client("s3"), IMAGE_STORE_S3_BUCKET, IMAGE_STORE_S3_PREFIX,
+                                            IMAGE_STORE_MAX_BYTES)
+            else:
+                _image_store = LocalImageStore(IMAGE_STORE_DIR, IMAGE_STORE_MAX_BYTES)
+        return _image_store
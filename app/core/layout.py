@@ -0,0 +1,308 @@
+"""Layout-preserving PyMuPDF extraction.
+
+:class:`PageLayout` reads a page's text spans (text, font, size, flags, bbox,
+block and line numbers) with a single ``get_text("dict")`` call and keeps them
+column-wise in numpy arrays. From that one pass it renders markdown, with
+headings inferred from font size relative to the body text and tables inferred
+from rows of aligned cells. It also provides the boxes drawn by the preview,
+so nothing re-parses the page to visualize it.
+
+:class:`BlockLayout` is the counterpart for engines that return typed blocks
+themselves, such as NVIDIA's models. It offers the same ``to_elements``,
+``stats`` and ``to_dict``, and :func:`layout_from_dict` restores either kind.
+"""
+import fitz
+import numpy as np
+
+# Font size relative to the body text at which a block becomes a heading level
+HEADING_RATIOS = ((1.6, 1), (1.3, 2), (1.15, 3))
+# Table cells narrower than this share of the page; wider rows are text columns
+MAX_CELL_WIDTH = 0.4
+# Engine block types (lowercased) that count as headings, tables and images
+HEADING_BLOCKS = {"title", "section-header", "section_header", "heading"}
+TABLE_BLOCKS = {"table"}
+IMAGE_BLOCKS = {"picture", "image", "figure"}
+
+
+class PageLayout:
+    """Text spans of one page stored column-wise, plus the page's image boxes.
+
+    Coordinates are PDF points. ``font`` indexes ``fonts``; ``block`` and
+    ``line`` number the layout units in PyMuPDF's reading order, and spans of
+    a line are contiguous.
+    """
+
+    COLUMNS = ("x0", "y0", "x1", "y1", "size", "flags", "font", "block", "line")
+
+    def __init__(self, texts, fonts, x0, y0, x1, y1, size, flags, font, block, line,
+                 images=(), width=0.0, height=0.0):
+        self.texts = list(texts)
+        self.fonts = list(fonts)
+        self.x0 = np.asarray(x0, dtype=np.float32)
+        self.y0 = np.asarray(y0, dtype=np.float32)
+        self.x1 = np.asarray(x1, dtype=np.float32)
+        self.y1 = np.asarray(y1, dtype=np.float32)
+        self.size = np.asarray(size, dtype=np.float32)
+        self.flags = np.asarray(flags, dtype=np.int32)
+        self.font = np.asarray(font, dtype=np.int32)
+        self.block = np.asarray(block, dtype=np.int32)
+        self.line = np.asarray(line, dtype=np.int32)
+        self.images = [tuple(bbox) for bbox in images]
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def from_page(cls, page):
+        """Read a PyMuPDF page; image data is not extracted, only image positions."""
+        data = page.get_text("dict", flags=fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES)
+        fonts = {}
+        texts, columns = [], []
+        line_num = 0
+        for block_num, block in enumerate(b for b in data["blocks"] if b.get("type") == 0):
+            for line in block["lines"]:
+                for span in line["spans"]:
+                    if not span["text"].strip():
+                        continue
+                    texts.append(span["text"])
+                    font = fonts.setdefault(span["font"], len(fonts))
+                    columns.append((*span["bbox"], span["size"], span["flags"], font, block_num, line_num))
+                line_num += 1
+        arrays = np.array(columns, dtype=np.float64).reshape(-1, len(cls.COLUMNS)).T
+        return cls(texts, list(fonts), *arrays,
+                   images=[info["bbox"] for info in page.get_image_info()],
+                   width=page.rect.width, height=page.rect.height)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def body_size(self):
+        """Character-weighted median font size, i.e. the size of running text."""
+        if not len(self):
+            return 0.0
+        lengths = np.fromiter((len(text) for text in self.texts), dtype=np.int64, count=len(self))
+        return float(np.median(np.repeat(self.size, lengths)))
+
+    def heading_level(self, size, body):
+        for ratio, level in HEADING_RATIOS:
+            if body and size >= body * ratio:
+                return level
+        return 0
+
+    def _lines(self):
+        """Per-line arrays: bbox, max font size, block and text."""
+        starts = np.flatnonzero(np.diff(self.line, prepend=-1))
+        ends = np.append(starts[1:], len(self))
+        return {
+            "x0": np.minimum.reduceat(self.x0, starts), "y0": np.minimum.reduceat(self.y0, starts),
+            "x1": np.maximum.reduceat(self.x1, starts), "y1": np.maximum.reduceat(self.y1, starts),
+            "size": np.maximum.reduceat(self.size, starts),
+            "block": self.block[starts],
+            "text": ["".join(self.texts[start:end]).strip() for start, end in zip(starts, ends)],
+        }
+
+    def _tables(self, lines, body):
+        """Find runs of aligned rows; returns ``{first_line: markdown}`` and the set of table lines."""
+        tolerance = body / 2
+        y_center = (lines["y0"] + lines["y1"]) / 2
+        rows = []
+        for i in np.lexsort((lines["x0"], y_center)):
+            if rows and abs(y_center[i] - rows[-1][0]) <= tolerance:
+                rows[-1][1].append(int(i))
+            else:
+                rows.append((y_center[i], [int(i)]))
+        rows = [sorted(cells, key=lambda i: lines["x0"][i]) for _, cells in rows]
+
+        def is_row(cells):
+            return (len(cells) >= 2
+                    and all(lines["x1"][i] - lines["x0"][i] < self.width * MAX_CELL_WIDTH for i in cells)
+                    and all(lines["x0"][b] >= lines["x1"][a] for a, b in zip(cells, cells[1:]))
+                    and all(self.heading_level(lines["size"][i], body) == 0 for i in cells))
+
+        def continues(previous, cells):
+            if len(previous) != len(cells) or lines["y0"][cells[0]] - lines["y1"][previous[0]] > 2.5 * body:
+                return False
+            return all(min(lines["x1"][a], lines["x1"][b]) > max(lines["x0"][a], lines["x0"][b]) - tolerance
+                       for a, b in zip(previous, cells))
+
+        runs, run = [], []
+        for cells in rows:
+            if is_row(cells) and (not run or continues(run[-1], cells)):
+                run.append(cells)
+                continue
+            runs.append(run)
+            run = [cells] if is_row(cells) else []
+        runs.append(run)
+
+        tables, table_lines = {}, set()
+        for run in runs:
+            if len(run) < 2:
+                continue
+            rendered = ["| " + " | ".join(lines["text"][i].replace("|", "\\|") for i in cells) + " |"
+                        for cells in run]
+            rendered.insert(1, "|" + " --- |" * len(run[0]))
+            members = [i for cells in run for i in cells]
+            tables[min(members)] = "\n".join(rendered)
+            table_lines.update(members)
+        return tables, table_lines
+
+    def to_markdown(self):
+        """Render the page as markdown: headings by font size, tables, paragraphs per block."""
+        if not len(self):
+            return ""
+        body = self.body_size()
+        lines = self._lines()
+        tables, table_lines = self._tables(lines, body)
+
+        parts, pending = [], []
+
+        def flush():
+            if not pending:
+                return
+            level = self.heading_level(max(lines["size"][i] for i in pending), body)
+            if level and len(pending) <= 3:
+                parts.append("#" * level + " " + " ".join(lines["text"][i] for i in pending))
+            else:
+                parts.append("\n".join(lines["text"][i] for i in pending))
+            pending.clear()
+
+        for i in range(len(lines["text"])):
+            if i in tables:
+                flush()
+                parts.append(tables[i])
+            elif i not in table_lines:
+                if pending and lines["block"][pending[-1]] != lines["block"][i]:
+                    flush()
+                pending.append(i)
+        flush()
+        return "\n\n".join(parts)
+
+    def to_elements(self):
+        """Visualization elements per text block (heading/text/table) and image."""
+        elements = []
+        if len(self):
+            body = self.body_size()
+            lines = self._lines()
+            _, table_lines = self._tables(lines, body)
+            starts = np.flatnonzero(np.diff(self.block, prepend=-1))
+            block_x0 = np.minimum.reduceat(self.x0, starts)
+            block_y0 = np.minimum.reduceat(self.y0, starts)
+            block_x1 = np.maximum.reduceat(self.x1, starts)
+            block_y1 = np.maximum.reduceat(self.y1, starts)
+            block_size = np.maximum.reduceat(self.size, starts)
+            table_blocks = {int(lines["block"][i]) for i in table_lines}
+            for n, start in enumerate(starts):
+                if int(self.block[start]) in table_blocks:
+                    kind = "table"
+                elif self.heading_level(block_size[n], body):
+                    kind = "heading"
+                else:
+                    kind = "text"
+                elements.append({"type": kind, "bbox": (float(block_x0[n]), float(block_y0[n]),
+                                                        float(block_x1[n]), float(block_y1[n]))})
+        elements.extend({"type": "image", "bbox": bbox} for bbox in self.images)
+        return elements
+
+    def stats(self):
+        """Counts of layout features found on the page."""
+        kinds = [element["type"] for element in self.to_elements()]
+        tables = self._tables(self._lines(), self.body_size())[0] if len(self) else {}
+        return {
+            "blocks": len(kinds) - len(self.images),
+            "headings": kinds.count("heading"),
+            "tables": len(tables),
+            "images": len(self.images),
+        }
+
+    def to_dict(self):
+        data = {name: getattr(self, name).tolist() for name in self.COLUMNS}
+        data.update(texts=self.texts, fonts=self.fonts, images=self.images, width=self.width, height=self.height)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["texts"], data["fonts"], *(data[name] for name in cls.COLUMNS),
+                   images=data.get("images", ()), width=data.get("width", 0.0), height=data.get("height", 0.0))
+
+
+def _normalized_bbox(value):
+    """A block's bbox as ``(x0, y0, x1, y1)`` page fractions, or None if it is unusable."""
+    if isinstance(value, dict):
+        value = [value.get(key) for key in ("xmin", "ymin", "xmax", "ymax")]
+    try:
+        return tuple(float(v) for v in value) if len(value) == 4 else None
+    except (TypeError, ValueError):
+        return None
+
+
+class BlockLayout:
+    """Typed text blocks of one page, as an OCR engine returned them.
+
+    ``bboxes`` are page fractions, or None for blocks that came without one;
+    ``width`` and ``height`` are the page size in PDF points used to place them.
+    """
+
+    def __init__(self, types, texts, bboxes=None, width=0.0, height=0.0):
+        self.types = [str(block_type).lower() for block_type in types]
+        self.texts = list(texts)
+        self.bboxes = list(bboxes) if bboxes is not None else [None] * len(self.texts)
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def from_blocks(cls, blocks, width=0.0, height=0.0):
+        """Build from decoded ``{"type", "text", "bbox"?}`` blocks."""
+        return cls([block.get("type", "text") for block in blocks],
+                   [block["text"] for block in blocks],
+                   [_normalized_bbox(block["bbox"]) if "bbox" in block else None for block in blocks],
+                   width, height)
+
+    def __len__(self):
+        return len(self.texts)
+
+    @staticmethod
+    def kind(block_type):
+        if block_type in HEADING_BLOCKS:
+            return "heading"
+        if block_type in TABLE_BLOCKS:
+            return "table"
+        if block_type in IMAGE_BLOCKS:
+            return "image"
+        return "text"
+
+    def to_elements(self):
+        """Visualization elements for the blocks that carry a bbox."""
+        elements = []
+        for block_type, bbox in zip(self.types, self.bboxes):
+            if bbox is None:
+                continue
+            x0, y0, x1, y1 = bbox
+            elements.append({"type": self.kind(block_type),
+                             "bbox": (x0 * self.width, y0 * self.height, x1 * self.width, y1 * self.height)})
+        return elements
+
+    def stats(self):
+        """Counts of layout features found on the page."""
+        kinds = [self.kind(block_type) for block_type in self.types]
+        return {
+            "blocks": len(kinds) - kinds.count("image"),
+            "headings": kinds.count("heading"),
+            "tables": kinds.count("table"),
+            "images": kinds.count("image"),
+        }
+
+    def to_dict(self):
+        blocks = [{"type": block_type, "text": text, "bbox": bbox}
+                  for block_type, text, bbox in zip(self.types, self.texts, self.bboxes)]
+        return {"blocks": blocks, "width": self.width, "height": self.height}
+
+    @classmethod
+    def from_dict(cls, data):
+        blocks = data["blocks"]
+        return cls([block["type"] for block in blocks], [block["text"] for block in blocks],
+                   [tuple(block["bbox"]) if block["bbox"] is not None else None for block in blocks],
+                   width=data.get("width", 0.0), height=data.get("height", 0.0))
+
+
+def layout_from_dict(data):
+    """Restore a :class:`PageLayout` or :class:`BlockLayout` saved with ``to_dict``."""
+    return BlockLayout.from_dict(data) if "blocks" in data else PageLayout.from_dict(data)
@@ -1,5 +1,181 @@
 from constants import OCR_METRICS, OCR_PERFORMANCE_METRICS
+from array import array
+from dataclasses import dataclass
+import math
 import re
+import threading
+
+import numpy as np
+
+_LINE = re.compile(r'^.*$', re.MULTILINE)
+_HEADER = re.compile(r'#+[ \t]+\S')
+_LIST_ITEM = re.compile(r'[ \t]*[-*][ \t]+\S')
+# Characters that are neither word characters nor punctuation OCR output normally contains
+_NOISE = re.compile(r"[^\w\s.,;:!?'\"()\[\]{}<>/\\|#*_`~@$%&+=^-]")
+
+
+@dataclass
+class TextStats:
+    """Counts describing an OCR output's text and markdown structure."""
+    chars: int = 0
+    words: int = 0
+    lines: int = 0
+    headers: int = 0
+    lists: int = 0
+    table_rows: int = 0
+    sections: int = 0
+    emphasis: int = 0
+    paragraphs: int = 0
+    indented: int = 0
+
+    @property
+    def avg_line_length(self):
+        return self.chars / max(self.lines, 1)
+
+
+def text_stats(text):
+    """Compute :class:`TextStats` in one pass over the lines of ``text``.
+
+    Lines are visited one match at a time and classified with string methods
+    and a few precompiled patterns, so no list of lines, words or matches is
+    built and the cost stays linear in the size of the text. ``lines`` counts
+    like ``str.splitlines`` for ``\\n``-separated text; ``paragraphs`` counts
+    runs of blank lines between content.
+    """
+    stats = TextStats(chars=len(text), lines=text.count('\n') + (not text.endswith('\n')) if text else 0)
+    blank_run = False
+    for match in _LINE.finditer(text):
+        line = match.group()
+        if not line or line.isspace():
+            blank_run = True
+            continue
+        if blank_run and stats.words:
+            stats.paragraphs += 1
+        blank_run = False
+
+        words = line.split()
+        stats.words += len(words)
+        first = line[0]
+        if first in ' \t':
+            stats.indented += 1
+        if first == '#' and _HEADER.match(line):
+            stats.headers += 1
+        elif words[0][0] in '-*' and _LIST_ITEM.match(line):
+            stats.lists += 1
+        if '|' in line and line.count('|') >= 2:
+            stats.table_rows += 1
+        if line.startswith('===') or ('---' in line and line.rstrip().endswith('---')):
+            stats.sections += 1
+        if ('*' in line or '_' in line or '`' in line) and line.count('*') + line.count('_') + line.count('`') >= 2:
+            stats.emphasis += 1
+    return stats
+
+
+def page_score(text, confidence=None, stats=None):
+    """Score one page of OCR output in [0, 1] from what its text looks like.
+
+    Empty pages score 0. Symbols the engine could not map and fragments too
+    short or too long to be words pull the score down. A measured engine
+    confidence (0-1), when there is one, caps the score.
+    """
+    stats = stats or text_stats(text)
+    if not stats.words:
+        return 0.0
+    visible = stats.chars - sum(text.count(c) for c in ' \t\r\n')
+    noise = sum(1 for _ in _NOISE.finditer(text))
+    score = max(0.0, 1.0 - 5.0 * noise / max(visible, 1))
+    if not 2 <= visible / stats.words <= 12:
+        score *= 0.5
+    if confidence is not None:
+        score = min(score, confidence)
+    return score
+
+
+class PageMetrics:
+    """Per-page quality metrics of one document, stored column-wise in typed arrays.
+
+    Pages are recorded as the engine finishes them, in any order and from any
+    thread; a page recorded again replaces its row. Aggregates are computed
+    on demand. ``confidence`` is NaN for pages without an engine confidence.
+    """
+
+    COLUMNS = (("page", "i"), ("words", "i"), ("lines", "i"), ("chars", "i"),
+               ("confidence", "f"), ("score", "f"))
+
+    def __init__(self):
+        self._columns = {name: array(code) for name, code in self.COLUMNS}
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getstate__(self):
+        # Locks do not pickle; results cross process boundaries in batch jobs
+        with self._lock:
+            return {"_columns": self._columns, "_rows": dict(self._rows)}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def record(self, page, text, confidence=None):
+        """Score ``page`` (0-based) from its text; returns the score."""
+        text = text or ""
+        stats = text_stats(text)
+        score = page_score(text, confidence, stats)
+        self._set(page, (page, stats.words, stats.lines, stats.chars,
+                         math.nan if confidence is None else confidence, score))
+        return score
+
+    def _set(self, page, values):
+        with self._lock:
+            row = self._rows.get(page)
+            if row is None:
+                self._rows[page] = len(self._rows)
+                for (name, _), value in zip(self.COLUMNS, values):
+                    self._columns[name].append(value)
+            else:
+                for (name, _), value in zip(self.COLUMNS, values):
+                    self._columns[name][row] = value
+
+    def column(self, name):
+        """A numpy copy of one column, in recording order."""
+        with self._lock:
+            return np.array(self._columns[name])
+
+    def score(self, page):
+        row = self._rows.get(page)
+        return None if row is None else float(self._columns["score"][row])
+
+    def low_pages(self, min_score):
+        """0-based pages scoring below ``min_score``, in page order."""
+        pages, scores = self.column("page"), self.column("score")
+        return sorted(int(page) for page in pages[scores < min_score])
+
+    def summary(self, min_score):
+        """Document-level aggregates plus the pages below ``min_score`` (1-based)."""
+        if not len(self):
+            return None
+        scores = self.column("score")
+        return {
+            "pages": len(scores),
+            "mean_score": round(float(scores.mean()), 4),
+            "min_score": round(float(scores.min()), 4),
+            "low_pages": [page + 1 for page in self.low_pages(min_score)],
+        }
+
+    def to_dict(self):
+        with self._lock:
+            return {name: self._columns[name].tolist() for name, _ in self.COLUMNS}
+
+    @classmethod
+    def from_dict(cls, data):
+        metrics = cls()
+        for values in zip(*(data[name] for name, _ in cls.COLUMNS)):
+            metrics._set(values[0], values)
+        return metrics
+
 
 class OCRMetricsAnalyzer:
     def __init__(self, provider):
@@ -13,36 +189,37 @@ class OCRMetricsAnalyzer:
     
     def _calculate_base_metrics(self, text):
         """Calculate base text metrics"""
+        stats = text_stats(text)
         metrics = {
-            "word_count": len(text.split()),
-            "line_count": len(text.splitlines()),
-            "char_count": len(text),
-            "avg_line_length": len(text) / max(len(text.splitlines()), 1),
+            "word_count": stats.words,
+            "line_count": stats.lines,
+            "char_count": stats.chars,
+            "avg_line_length": stats.avg_line_length,
             "confidence_score": OCR_PERFORMANCE_METRICS["providers"][self.provider]["base_conf"],
-            "structure_score": self._calculate_structure_score(text),
-            "format_retention": self._calculate_format_retention(text)
+            "structure_score": self._calculate_structure_score(stats),
+            "format_retention": self._calculate_format_retention(stats)
         }
         return metrics
     
-    def _calculate_structure_score(self, text):
+    def _calculate_structure_score(self, stats):
         """Calculate structure preservation score"""
         structure_indicators = {
-            "headers": len(re.findall(r'^#+\s+.+$', text, re.MULTILINE)),
-            "lists": len(re.findall(r'^\s*[-*]\s+.+$', text, re.MULTILINE)),
-            "tables": len(re.findall(r'\|.*\|', text, re.MULTILINE)),
-            "sections": len(re.findall(r'^={3,}|-{3,}$', text, re.MULTILINE))
+            "headers": stats.headers,
+            "lists": stats.lists,
+            "tables": stats.table_rows,
+            "sections": stats.sections
         }
         
         base_score = OCR_PERFORMANCE_METRICS["providers"][self.provider]["base_conf"]
         bonus = sum(1 for count in structure_indicators.values() if count > 0) * 0.05
         return min(base_score + bonus, 1.0)
     
-    def _calculate_format_retention(self, text):
+    def _calculate_format_retention(self, stats):
         """Calculate format retention score"""
         format_indicators = {
-            "markdown": len(re.findall(r'[*_`].*[*_`]', text)),
-            "whitespace": text.count('\n\n'),
-            "indentation": len(re.findall(r'^\s+\S', text, re.MULTILINE))
+            "markdown": stats.emphasis,
+            "whitespace": stats.paragraphs,
+            "indentation": stats.indented
         }
         
         base_score = OCR_PERFORMANCE_METRICS["providers"][self.provider]["base_conf"]
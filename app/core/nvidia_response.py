@@ -0,0 +1,141 @@
+"""Decoding of NVIDIA chat-completion responses into text blocks.
+
+The endpoint's models put their output in different places: tool-call
+arguments holding a JSON array of blocks (nemotron-parse), a plain ``content``
+string, a list of content parts, or ``parts``/``outputs``/``segments``. Rather
+than probing every shape on every page, :class:`ResponseDecoder` finds the
+shape that works for a model once and then goes straight to it. A response with
+no recognisable content raises :class:`NVIDIAResponseError` and is never
+stringified into page text.
+"""
+import json
+import threading
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+TEXT_KEYS = ('markdown_text', 'text', 'content', 'body', 'markdown', 'output_text')
+
+
+class NVIDIAResponseError(ValueError):
+    """Raised when a response holds no content in any known shape."""
+
+
+def _block(item, default_type="text"):
+    """Turn a string or a dict part into a block dict, or None if it has no text."""
+    if isinstance(item, str):
+        text = item.strip()
+        return {"type": default_type, "text": text} if text else None
+    if isinstance(item, dict):
+        for key in TEXT_KEYS:
+            value = item.get(key)
+            if isinstance(value, str) and value.strip():
+                block = {"type": item.get("type", default_type), "text": value.strip()}
+                if "bbox" in item:
+                    block["bbox"] = item["bbox"]
+                return block
+    return None
+
+
+def _blocks(items):
+    """Collect blocks from a (possibly nested) list of parts."""
+    blocks = []
+    stack = [items]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, list):
+            stack.extend(reversed(current))
+        else:
+            block = _block(current)
+            if block:
+                blocks.append(block)
+    return blocks
+
+
+def _message(choice):
+    message = choice.get('message')
+    return message if isinstance(message, dict) else {}
+
+
+def _from_tool_calls(choice):
+    blocks = []
+    for call in _message(choice).get('tool_calls') or ():
+        arguments = (call.get('function') or {}).get('arguments') if isinstance(call, dict) else None
+        if isinstance(arguments, (str, bytes)):
+            try:
+                arguments = loads(arguments)
+            except json.JSONDecodeError:
+                continue
+        blocks.extend(_blocks(arguments))
+    return blocks
+
+
+def _from_content(choice):
+    content = _message(choice).get('content')
+    return _blocks(content) if isinstance(content, (str, list)) else []
+
+
+def _from_parts(choice):
+    message = _message(choice)
+    for key in ('parts', 'outputs', 'segments'):
+        if isinstance(message.get(key), list):
+            blocks = _blocks(message[key])
+            if blocks:
+                return blocks
+    return []
+
+
+def _from_choice(choice):
+    for key in ('content', 'text', 'response', 'output'):
+        value = choice.get(key)
+        if isinstance(value, (str, list)):
+            blocks = _blocks(value)
+            if blocks:
+                return blocks
+    return []
+
+
+EXTRACTORS = (_from_tool_calls, _from_content, _from_parts, _from_choice)
+
+
+class ResponseDecoder:
+    """Extract blocks from response bodies, remembering which shape each model uses."""
+
+    def __init__(self):
+        self._schemas = {}
+        self._lock = threading.Lock()
+
+    def decode(self, model, body):
+        """Return the blocks of the first choice in ``body`` (a dict or raw JSON bytes)."""
+        if isinstance(body, (bytes, str)):
+            body = loads(body)
+        choices = body.get('choices') if isinstance(body, dict) else None
+        if not choices or not isinstance(choices[0], dict):
+            raise NVIDIAResponseError("response has no choices")
+        choice = choices[0]
+
+        extractor = self._schemas.get(model)
+        if extractor:
+            blocks = extractor(choice)
+            if blocks:
+                return blocks
+        for candidate in EXTRACTORS:
+            if candidate is extractor:
+                continue
+            blocks = candidate(choice)
+            if blocks:
+                with self._lock:
+                    self._schemas[model] = candidate
+                return blocks
+        raise NVIDIAResponseError(f"no content found in response (finish_reason={choice.get('finish_reason')})")
+
+
+def blocks_to_text(blocks):
+    """Join block texts into page markdown."""
+    return "\n\n".join(block["text"] for block in blocks)
+
+
+decoder = ResponseDecoder()
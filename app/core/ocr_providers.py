@@ -0,0 +1,1037 @@
+"""Streamlit-free OCR engine.
+
+Every provider takes an :class:`EngineConfig` plus the document bytes and
+reports through an :class:`OCRResult` (text, errors, timings) instead of
+``st.*`` calls, so it can run in worker processes and background jobs. The
+Streamlit page talks to this module through the adapter in the top-level
+``ocr_providers.py``.
+"""
+import asyncio
+import functools
+import io
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+
+from mistralai.client import Mistral
+import requests
+import google.generativeai as genai
+import pytesseract
+import fitz
+import PyPDF2
+from PIL import Image
+
+from app.core.cache import get_result_cache
+from app.core.doc_handles import open_document
+from app.core.http_transport import get_transport
+from app.core.image_payload import build_json_body, encode_file_image, encode_image, image_content
+from app.core.layout import BlockLayout, PageLayout, layout_from_dict
+from app.core.metrics import PageMetrics
+from app.core.nvidia_response import NVIDIAResponseError, blocks_to_text, decoder as nvidia_decoder
+from app.core.documents import (
+    prepare_file_for_mistral,
+    inline_image_type,
+    data_url,
+    pdf_page_count,
+    iter_pdf_pages,
+    page_fingerprints,
+    extract_ocr_pages,
+)
+from app.core.page_router import blank_pages, route_pages
+from app.core.pipeline import run_chunked, document_key
+from app.core.tesseract_engine import WordBoxes, ocr_pdf_pages, recognize_image
+from constants import (
+    API_KEY_NAMES,
+    OCR_MODELS,
+    PROVIDER_CONCURRENCY,
+    PDF_RENDER_DPI,
+    PDF_RENDER_COLORSPACE,
+    PDF_CHUNK_PAGES,
+    TESSERACT_WORKERS,
+    TESSERACT_STRUCTURED,
+    PYMUPDF_STRUCTURED,
+    NVIDIA_TRANSPORT,
+    NVIDIA_IMAGE,
+    MISTRAL_INLINE_MAX_BYTES,
+    NATIVE_TEXT_ROUTING,
+    NATIVE_TEXT_ROUTER,
+    PAGE_MIN_SCORE,
+    PAGE_REOCR_PROVIDER,
+    CASCADE,
+)
+
+CASCADE_PROVIDER = "Cascade"
+
+
+class ProviderError(Exception):
+    """Raised when a provider cannot be initialized or used."""
+
+
+def _api_keys_from_env():
+    return {provider: os.environ[name] for provider, name in API_KEY_NAMES.items() if os.environ.get(name)}
+
+
+@dataclass
+class EngineConfig:
+    """Settings for an engine run; defaults come from constants.py and the environment."""
+    api_keys: dict = field(default_factory=_api_keys_from_env)
+    models: dict = field(default_factory=lambda: dict(OCR_MODELS))
+    concurrency: dict = field(default_factory=lambda: dict(PROVIDER_CONCURRENCY))
+    dpi: int = PDF_RENDER_DPI
+    colorspace: str = PDF_RENDER_COLORSPACE
+    chunk_pages: int = PDF_CHUNK_PAGES
+    tesseract_workers: int = TESSERACT_WORKERS
+    tesseract_structured: bool = TESSERACT_STRUCTURED
+    pymupdf_structured: bool = PYMUPDF_STRUCTURED
+    nvidia_transport: dict = field(default_factory=lambda: dict(NVIDIA_TRANSPORT))
+    nvidia_image: dict = field(default_factory=lambda: dict(NVIDIA_IMAGE))
+    mistral_inline_max_bytes: int = MISTRAL_INLINE_MAX_BYTES
+    native_routing: bool = NATIVE_TEXT_ROUTING
+    native_router: dict = field(default_factory=lambda: dict(NATIVE_TEXT_ROUTER))
+    use_cache: bool = True
+    image_store: object = None
+    min_page_score: float = PAGE_MIN_SCORE
+    reocr_provider: str = PAGE_REOCR_PROVIDER
+    cascade: dict = field(default_factory=lambda: dict(CASCADE))
+
+
+@dataclass
+class OCRResult:
+    """Outcome of one engine run."""
+    provider: str
+    model: str = None
+    text: str = None
+    errors: list = field(default_factory=list)
+    timings: dict = field(default_factory=dict)
+    page_timings: dict = field(default_factory=dict)
+    page_words: dict = field(default_factory=dict)
+    page_layouts: dict = field(default_factory=dict)
+    page_texts: dict = field(default_factory=dict)
+    failed_pages: set = field(default_factory=set)
+    page_metrics: PageMetrics = field(default_factory=PageMetrics)
+    reocr_pages: dict = field(default_factory=dict)
+    cascade: dict = None
+    images: dict = None
+    from_cache: bool = False
+
+    @property
+    def ok(self):
+        return bool(self.text)
+
+    def mean_confidence(self):
+        """Word-weighted mean OCR confidence in [0, 1], or None without word data."""
+        total = sum(len(words) for words in self.page_words.values())
+        if not total:
+            return None
+        return sum(float(words.conf.sum()) for words in self.page_words.values()) / total / 100
+
+    def layout_stats(self):
+        """Layout feature counts summed over pages, or None without layout data."""
+        if not self.page_layouts:
+            return None
+        totals = {}
+        for layout in self.page_layouts.values():
+            for name, count in layout.stats().items():
+                totals[name] = totals.get(name, 0) + count
+        return totals
+
+    def page_summary(self, min_score=PAGE_MIN_SCORE):
+        """Per-page score aggregates and low pages, or None without page data."""
+        summary = self.page_metrics.summary(min_score)
+        if summary and self.cascade and self.cascade["blank"]:
+            # Blank pages score 0 but there is nothing to fix on them
+            summary["blank_pages"] = self.cascade["blank"]
+            summary["low_pages"] = [page for page in summary["low_pages"] if page not in self.cascade["blank"]]
+        if summary and self.reocr_pages:
+            summary["reocr_pages"] = {page_num + 1: provider for page_num, provider in self.reocr_pages.items()}
+        return summary
+
+
+class _Run:
+    """Per-call state threaded through a provider: config, result and progress hook."""
+
+    def __init__(self, provider, config, result, on_progress=None):
+        self.provider = provider
+        self.config = config
+        self.result = result
+        self.on_progress = on_progress
+
+    def error(self, message):
+        logging.error(message)
+        self.result.errors.append(message)
+
+    def record_page(self, page_num, text):
+        """Keep a finished page's text and score it; safe to call from worker threads.
+
+        A page that failed (``text`` None) is kept as empty, so it scores 0 and
+        is still part of the document's page set, and is listed in
+        ``failed_pages`` so the result is neither checkpointed nor cached.
+        """
+        if text is None:
+            self.result.failed_pages.add(page_num)
+        else:
+            self.result.failed_pages.discard(page_num)
+        text = text or ""
+        self.result.page_texts[page_num] = text
+        words = self.result.page_words.get(page_num)
+        self.result.page_metrics.record(page_num, text, words.mean_confidence() if words is not None else None)
+
+    def chunked(self, file_bytes, num_pages, process_range, chunk_size=None):
+        """Run ``process_range`` over the document in checkpointed page windows.
+
+        Checkpoints are keyed like the document cache, so a resumed run never
+        mixes in chunks produced with other output settings.
+        """
+        return run_chunked(file_bytes, num_pages, process_range,
+                           key_parts=(self.provider, self.result.model) + _output_parts(self.config, self.provider),
+                           chunk_size=chunk_size or self.config.chunk_pages, on_chunk=self.on_progress,
+                           on_failure=self._chunk_failed, page_entries=self._page_entries,
+                           on_restore=self._restore_pages, is_complete=self._chunk_complete)
+
+    def _chunk_failed(self, start, end):
+        self.error(f"{self.provider}: processing stopped at pages {start + 1}-{end}")
+
+    def _chunk_complete(self, start, end):
+        return not any(start <= page_num < end for page_num in self.result.failed_pages)
+
+    def _page_entries(self, start, end):
+        """Checkpoint data for pages ``start..end-1``: text plus word boxes and layout where present."""
+        result = self.result
+        entries = {}
+        for page_num in range(start, end):
+            if page_num not in result.page_texts:
+                continue
+            entry = {"text": result.page_texts[page_num]}
+            if page_num in result.page_words:
+                entry["words"] = result.page_words[page_num].to_dict()
+            if page_num in result.page_layouts:
+                entry["layout"] = result.page_layouts[page_num].to_dict()
+            entries[page_num] = entry
+        return entries
+
+    def restore_page(self, page_num, entry):
+        """Record a page from a saved entry, along with its word boxes and layout."""
+        if "words" in entry:
+            self.result.page_words[page_num] = WordBoxes.from_dict(entry["words"])
+        if "layout" in entry:
+            self.result.page_layouts[page_num] = layout_from_dict(entry["layout"])
+        self.record_page(page_num, entry["text"])
+
+    def _restore_pages(self, entries):
+        """Replay the pages of a chunk loaded from a checkpoint, as if they had just been processed."""
+        for page_num, entry in entries.items():
+            self.restore_page(int(page_num), entry)
+
+    def cache_parts(self, *parts):
+        """Per-page cache key parts, or None when caching is disabled."""
+        if not self.config.use_cache:
+            return None
+        return (self.provider, self.result.model) + parts
+
+    def routing_parts(self):
+        """Cache key parts describing native-text routing, so toggling it changes keys."""
+        if not self.config.native_routing:
+            return ()
+        return ("native",) + tuple(sorted(self.config.native_router.items()))
+
+    def route(self, file_bytes, page_numbers, process_ocr):
+        """Read digital pages from the text layer and pass only the rest to ``process_ocr``.
+
+        ``process_ocr(page_numbers)`` returns ``{page_number: text or entry}``;
+        the merged result is in page order.
+        """
+        if not self.config.native_routing:
+            return process_ocr(page_numbers)
+        started = time.perf_counter()
+        native, scanned = route_pages(file_bytes, page_numbers, **self.config.native_router)
+        for page_num, text in native.items():
+            self.result.page_timings[page_num] = (time.perf_counter() - started) / len(page_numbers)
+            self.record_page(page_num, text)
+        logging.info(f"{self.provider}: {len(native)} pages read from the text layer, {len(scanned)} sent to OCR")
+
+        processed = dict(native)
+        if scanned:
+            ocr_results = process_ocr(scanned)
+            if ocr_results is None:
+                return None
+            processed.update(ocr_results)
+        return {page_num: processed[page_num] for page_num in page_numbers if page_num in processed}
+
+
+@functools.lru_cache(maxsize=None)
+def get_client(provider, api_key=None):
+    """Initialize OCR provider client"""
+    if provider == "Mistral":
+        if not api_key:
+            raise ProviderError("Mistral API key not found")
+        return Mistral(api_key=api_key)
+    elif provider == "Google":
+        if not api_key:
+            raise ProviderError("Google API key not found")
+        genai.configure(api_key=api_key)
+        return genai.GenerativeModel('gemini-2.5-flash')
+    elif provider == "Tesseract":
+        if sys.platform.startswith('win'):
+            # Use environment variable for Tesseract path, with a fallback
+            pytesseract.pytesseract.tesseract_cmd = os.environ.get('TESSERACT_PATH', r'C:\Program Files\Tesseract-OCR\tesseract.exe')
+        return pytesseract
+    elif provider == "PyMuPDF":
+        return fitz
+    elif provider == "PyPDF2":
+        return PyPDF2
+    elif provider == "NVIDIA":
+        if not api_key:
+            raise ProviderError("NVIDIA API key not found")
+        # For NVIDIA, the "client" is just the API key for the requests header
+        return api_key
+    raise ProviderError(f"Unknown provider: {provider}")
+
+
+def _mistral_document(url, url_type="document_url"):
+    return {
+        "type": url_type,
+        url_type: url,
+        "include_image_base64": True,
+        "layout_info": True,
+        "tables": True
+    }
+
+
+def _collect_mistral_pages(ocr_response, page_offset, run):
+    """Turn an OCR response into ``{page_index: markdown}``, recording stored images on the run."""
+    response_dict = ocr_response.model_dump() if hasattr(ocr_response, 'model_dump') else json.loads(str(ocr_response))
+    pages, location, image_keys = extract_ocr_pages(response_dict, page_offset, store=run.config.image_store)
+    for page_idx, text in pages.items():
+        run.record_page(page_idx, text)
+    if image_keys:
+        images = run.result.images or {"dir": location, "files": []}
+        images["files"].extend(key for key in image_keys if key not in images["files"])
+        run.result.images = images
+    return pages
+
+
+def _inline_image(file_bytes, file_name, run):
+    """Image URL document for a small JPEG/PNG/WebP upload, or None to go through PDF."""
+    image_type = inline_image_type(file_name)
+    if image_type and len(file_bytes) <= run.config.mistral_inline_max_bytes:
+        return _mistral_document(data_url(file_bytes, image_type), "image_url")
+    return None
+
+
+def _join_pages(pages):
+    return "\n\n".join(pages[page_idx] for page_idx in sorted(pages))
+
+
+def _mistral_calls(client):
+    """The Mistral client calls the OCR flow makes: ``(ocr, upload, signed_url, delete)``."""
+    return client.ocr.process, client.files.upload, client.files.get_signed_url, client.files.delete
+
+
+def _mistral_async_calls(client, loop):
+    """:func:`_mistral_calls` on the async client, blocking a worker thread on ``loop``."""
+    def blocking(method):
+        return lambda **kwargs: asyncio.run_coroutine_threadsafe(method(**kwargs), loop).result()
+    return tuple(blocking(method) for method in (client.ocr.process_async, client.files.upload_async,
+                                                 client.files.get_signed_url_async, client.files.delete_async))
+
+
+def process_mistral(client, file_bytes, file_name, model, run):
+    return _process_mistral(_mistral_calls(client), file_bytes, file_name, model, run)
+
+
+def _process_mistral(calls, file_bytes, file_name, model, run):
+    ocr, upload, signed_url, delete = calls
+    image_document = _inline_image(file_bytes, file_name, run)
+    if image_document:
+        ocr_response = ocr(model=model, document=image_document)
+        return _join_pages(_collect_mistral_pages(ocr_response, 0, run))
+
+    prepared_bytes, prepared_name = prepare_file_for_mistral(file_bytes, file_name)
+    num_pages = pdf_page_count(prepared_bytes)
+    uploaded_file = None
+    document_url = None
+
+    def get_document_url():
+        # Resolve lazily: a re-run whose pages are all cached never touches the API
+        nonlocal uploaded_file, document_url
+        if document_url is None:
+            # Every chunk is a request of its own, so an inline document would be
+            # sent again in full per chunk; several chunks share one upload instead
+            if len(prepared_bytes) <= run.config.mistral_inline_max_bytes and num_pages <= run.config.chunk_pages:
+                document_url = data_url(prepared_bytes, "application/pdf")
+            else:
+                uploaded_file = upload(
+                    file={"file_name": prepared_name, "content": prepared_bytes},
+                    purpose="ocr"
+                )
+                document_url = signed_url(file_id=uploaded_file.id).url
+        return document_url
+
+    def process_missing(page_numbers):
+        ocr_response = ocr(
+            model=model,
+            document=_mistral_document(get_document_url()),
+            pages=page_numbers
+        )
+        return _collect_mistral_pages(ocr_response, page_numbers[0], run)
+
+    def process_range(start, end):
+        cache_parts = run.cache_parts()
+        if cache_parts is None:
+            return "\n\n".join(process_missing(list(range(start, end))).values())
+        return _process_cached_pages(prepared_bytes, start, end, process_missing, cache_parts,
+                                     on_cached=run.restore_page)
+
+    try:
+        return run.chunked(prepared_bytes, num_pages, process_range)
+    finally:
+        if uploaded_file is not None:
+            try:
+                delete(file_id=uploaded_file.id)
+            except Exception as e:
+                logging.warning(f"Could not delete uploaded Mistral file {uploaded_file.id}: {e}")
+
+
+async def process_mistral_async(client, file_bytes, file_name, model, run):
+    """Asynchronous :func:`process_mistral` for batch jobs.
+
+    The same chunked, checkpointed and per-page cached flow runs in a worker
+    thread, and its upload, signed URL and OCR requests are awaited on the
+    SDK's async client in this event loop. While one document waits on OCR,
+    others can already be uploading.
+    """
+    calls = _mistral_async_calls(client, asyncio.get_running_loop())
+    return await asyncio.to_thread(_process_mistral, calls, file_bytes, file_name, model, run)
+
+
+def _as_entry(value):
+    return value if isinstance(value, dict) else {"text": value}
+
+
+def _join_entries(entries):
+    texts = (_as_entry(value)["text"] for value in entries.values())
+    return "\n\n".join(text for text in texts if text)
+
+
+def _process_cached_pages(file_bytes, start, end, process_missing, cache_parts, on_cached=None):
+    """Serve pages ``start..end-1`` from the per-page cache, processing only the rest.
+
+    Pages are keyed by their content fingerprint plus ``cache_parts``, so an
+    unchanged page in a revised PDF is not sent to the provider again.
+    ``process_missing(page_numbers)`` returns ``{page_number: text}`` for the
+    pages not found in the cache, or ``{page_number: entry}`` where ``entry`` is
+    a JSON-able dict with a ``"text"`` key plus whatever else should be cached.
+    ``on_cached(page_number, entry)`` sees every entry served from the cache.
+    Returns the stitched text in page order.
+    """
+    page_cache = get_result_cache()
+    page_keys = {}
+    texts = {}
+    for page_num, fingerprint in enumerate(page_fingerprints(file_bytes, start, end), start=start):
+        page_keys[page_num] = document_key(fingerprint.encode(), "page", *cache_parts)
+        cached = page_cache.get(page_keys[page_num])
+        if cached is not None:
+            texts[page_num] = cached["text"]
+            if on_cached:
+                on_cached(page_num, cached)
+
+    if not page_keys:
+        return None
+
+    missing = [page_num for page_num in page_keys if page_num not in texts]
+    if missing:
+        logging.info(f"Pages {start + 1}-{end}: {len(texts)} cached, {len(missing)} to process")
+        processed = process_missing(missing)
+        if processed is None:
+            return None
+        for page_num, value in processed.items():
+            entry = _as_entry(value)
+            texts[page_num] = entry["text"]
+            if entry["text"] is not None and page_num in page_keys:
+                page_cache.set(page_keys[page_num], entry)
+
+    return "\n\n".join(texts[page_num] for page_num in sorted(texts) if texts[page_num])
+
+
+def _process_pdf_pages(file_bytes, processing_function, start, end, run, max_workers=1,
+                       dpi=None, colorspace=None, cache_parts=None):
+    """Helper to iterate through PDF pages and apply a processing function.
+
+    ``start``/``end`` select the 0-based page window (``end`` exclusive) so the
+    helper can serve one chunk of a larger document. Pages are rendered lazily,
+    so processing of page 1 starts while later pages are still to be rasterized.
+    When ``max_workers`` is greater than one, pages are dispatched concurrently
+    with at most ``max_workers`` in flight. Results are always joined in page
+    order and each page's processing time lands in ``run.result.page_timings``.
+    ``processing_function`` returns a page's text, or an entry whose
+    ``"layout"`` (a layout's ``to_dict``) is kept in ``run.result.page_layouts``.
+    With ``cache_parts`` (provider and model), pages already in the per-page
+    cache are neither rendered nor processed. With native routing enabled,
+    digital pages are read from the text layer and never rendered either.
+    """
+    dpi = dpi or run.config.dpi
+    colorspace = colorspace or run.config.colorspace
+    page_timings = run.result.page_timings
+
+    def timed(page_num, image):
+        started = time.perf_counter()
+        value = processing_function(image)
+        page_timings[page_num] = time.perf_counter() - started
+        if value is None:
+            run.record_page(page_num, None)
+        else:
+            run.restore_page(page_num, _as_entry(value))
+        return value
+
+    def process_missing(page_numbers):
+        pages = zip(page_numbers, iter_pdf_pages(file_bytes, dpi=dpi, colorspace=colorspace, pages=page_numbers))
+        texts = {}
+
+        if max_workers > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                pending = deque()
+                for page_num, image in pages:
+                    pending.append((page_num, executor.submit(timed, page_num, image)))
+                    if len(pending) >= max_workers:
+                        page_num, future = pending.popleft()
+                        texts[page_num] = future.result()
+                for page_num, future in pending:
+                    texts[page_num] = future.result()
+        else:
+            for page_num, image in pages:
+                texts[page_num] = timed(page_num, image)
+        return texts
+
+    def process_routed(page_numbers):
+        return run.route(file_bytes, page_numbers, process_missing)
+
+    if cache_parts is not None:
+        return _process_cached_pages(file_bytes, start, end, process_routed,
+                                     (dpi, colorspace) + tuple(cache_parts) + run.routing_parts(),
+                                     on_cached=run.restore_page)
+
+    texts = process_routed(list(range(start, end)))
+    if not texts:
+        return None
+    return _join_entries(texts)
+
+
+def process_google(client, file_bytes, file_name, model, run):
+    prompt = "Extract all text and describe any images from this document in markdown format. For each image, provide a detailed description and include its position in the document."
+    if file_name.lower().endswith('.pdf'):
+        def process_page(image):
+            img_bytes = io.BytesIO()
+            image.save(img_bytes, format='PNG')
+            response = client.generate_content([prompt, {"mime_type": "image/png", "data": img_bytes.getvalue()}])
+            return response.text
+        return run.chunked(
+            file_bytes, pdf_page_count(file_bytes),
+            lambda start, end: _process_pdf_pages(file_bytes, process_page, start, end, run,
+                                                  max_workers=run.config.concurrency.get("Google", 1),
+                                                  cache_parts=run.cache_parts()))
+    else:
+        response = client.generate_content([prompt, {"mime_type": "image/png", "data": file_bytes}])
+        return response.text
+
+
+def process_tesseract(client, file_bytes, file_name, model, run):
+    if file_name.lower().endswith('.pdf'):
+        workers = run.config.tesseract_workers
+        structured = run.config.tesseract_structured
+        dpi = run.config.dpi
+
+        def process_missing(page_numbers):
+            page_texts = ocr_pdf_pages(file_bytes, page_numbers, lang='eng', dpi=dpi,
+                                       colorspace="gray", max_workers=workers, structured=structured)
+            entries = {}
+            for page_text in page_texts:
+                run.result.page_timings[page_text.page] = page_text.seconds
+                entries[page_text.page] = {"text": page_text.text}
+                if page_text.words is not None:
+                    run.result.page_words[page_text.page] = page_text.words
+                    entries[page_text.page]["words"] = page_text.words.to_dict()
+                run.record_page(page_text.page, page_text.text)
+            return entries
+
+        def process_routed(page_numbers):
+            return run.route(file_bytes, page_numbers, process_missing)
+
+        def process_range(start, end):
+            cache_parts = run.cache_parts("eng", "data" if structured else "text")
+            if cache_parts is None:
+                return _join_entries(process_routed(list(range(start, end))))
+            return _process_cached_pages(file_bytes, start, end, process_routed,
+                                         (dpi, "gray") + cache_parts + run.routing_parts(),
+                                         on_cached=run.restore_page)
+
+        # Windows must be wide enough to keep every worker busy
+        return run.chunked(file_bytes, pdf_page_count(file_bytes), process_range,
+                           chunk_size=max(run.config.chunk_pages, workers * 2))
+    else:
+        image = Image.open(io.BytesIO(file_bytes))
+        text, words = recognize_image(image, lang='eng', structured=run.config.tesseract_structured)
+        if words is not None:
+            run.result.page_words[0] = words
+        return text
+
+
+def process_pymupdf(client, file_bytes, file_name, model, run):
+    if not file_name.lower().endswith('.pdf'):
+        run.error("PyMuPDF only supports PDF files")
+        return None
+    doc_key = document_key(file_bytes)
+
+    def process_range(start, end):
+        texts = []
+        # Locked one page at a time, so the preview can render between pages
+        for i in range(start, end):
+            with open_document(file_bytes, doc_key=doc_key) as doc:
+                if run.config.pymupdf_structured:
+                    layout = PageLayout.from_page(doc[i])
+                    run.result.page_layouts[i] = layout
+                    texts.append(layout.to_markdown())
+                else:
+                    texts.append(doc[i].get_text())
+            run.record_page(i, texts[-1])
+        return "\n\n".join(texts)
+    return run.chunked(file_bytes, pdf_page_count(file_bytes, doc_key), process_range)
+
+
+def process_pypdf2(client, file_bytes, file_name, model, run):
+    if not file_name.lower().endswith('.pdf'):
+        run.error("PyPDF2 only supports PDF files")
+        return None
+    pdf_reader = client.PdfReader(io.BytesIO(file_bytes))
+
+    def process_range(start, end):
+        texts = []
+        for i in range(start, end):
+            texts.append(pdf_reader.pages[i].extract_text())
+            run.record_page(i, texts[-1])
+        return "\n\n".join(texts)
+    return run.chunked(file_bytes, len(pdf_reader.pages), process_range)
+
+
+def process_nvidia(api_key, file_bytes, file_name, model, run):
+    """Process file with NVIDIA OCR"""
+    invoke_url = "https://integrate.api.nvidia.com/v1/chat/completions"
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+    }
+    tool_name = "markdown_no_bbox"
+    transport = get_transport("NVIDIA", run.config.nvidia_transport)
+
+    image_settings = run.config.nvidia_image
+    encoding = (image_settings["format"], image_settings["quality"], image_settings["max_side"])
+
+    def process_image_bytes(image_bytes, mime_type):
+        payload = {
+            "model": model,
+            "messages": [{"role": "user", "content": image_content()}],
+            "tools": [{"type": "function", "function": {"name": tool_name}}],
+            "tool_choice": {"type": "function", "function": {"name": tool_name}},
+            "max_tokens": 4096,
+            "temperature": 0.2,
+        }
+        body = build_json_body(payload, image_bytes, mime_type)
+
+        try:
+            response = transport.post(invoke_url, headers=headers, data=body)
+            response.raise_for_status()
+            return nvidia_decoder.decode(model, response.content)
+        except requests.RequestException as e:
+            run.error(f"NVIDIA API request failed: {e}")
+            if getattr(e, "response", None):
+                try:
+                    run.error(f"Response body: {e.response.text}")
+                except Exception:
+                    pass
+            return None
+        except (json.JSONDecodeError, NVIDIAResponseError) as e:
+            run.error(f"Failed to parse NVIDIA response: {e}")
+            return None
+
+    if file_name.lower().endswith('.pdf'):
+        dpi = image_settings["dpi"]
+
+        def process_page(image):
+            blocks = process_image_bytes(*encode_image(image, *encoding))
+            if blocks is None:
+                return None
+            # Rendered at ``dpi``, so the page size in PDF points is pixels * 72 / dpi
+            layout = BlockLayout.from_blocks(blocks, image.width * 72 / dpi, image.height * 72 / dpi)
+            return {"text": blocks_to_text(blocks), "layout": layout.to_dict()}
+        cache_parts = run.cache_parts(*encoding)
+        return run.chunked(
+            file_bytes, pdf_page_count(file_bytes),
+            lambda start, end: _process_pdf_pages(file_bytes, process_page, start, end, run,
+                                                  max_workers=run.config.concurrency.get("NVIDIA", 1),
+                                                  dpi=dpi, cache_parts=cache_parts))
+    else:
+        blocks = process_image_bytes(*encode_file_image(file_bytes, *encoding))
+        if blocks is None:
+            return None
+        with Image.open(io.BytesIO(file_bytes)) as image:
+            run.result.page_layouts[0] = BlockLayout.from_blocks(blocks, *image.size)
+        return blocks_to_text(blocks)
+
+
+PROCESSORS = {
+    "Mistral": process_mistral,
+    "Google": process_google,
+    "Tesseract": process_tesseract,
+    "PyMuPDF": process_pymupdf,
+    "PyPDF2": process_pypdf2,
+    "NVIDIA": process_nvidia,
+}
+
+# Providers with a native asyncio implementation; the rest run in a thread.
+ASYNC_PROCESSORS = {
+    "Mistral": process_mistral_async,
+}
+
+
+def _reocr_parts(config, provider):
+    """Cache key parts for low-page re-OCR, which changes the stored text."""
+    if not config.reocr_provider or config.reocr_provider == provider:
+        return ()
+    return ("reocr", config.reocr_provider, config.min_page_score)
+
+
+def _output_parts(config, provider):
+    """Document cache key parts for the settings that shape ``provider``'s output."""
+    parts = ()
+    if provider == "PyMuPDF":
+        parts = ("structured", config.pymupdf_structured)
+    elif provider == "Tesseract":
+        parts = ("structured", config.tesseract_structured, config.dpi)
+    elif provider == "Google":
+        parts = (config.dpi, config.colorspace)
+    elif provider == "NVIDIA":
+        parts = tuple(sorted(config.nvidia_image.items()))
+    if provider in ("Tesseract", "Google", "NVIDIA"):
+        # Routed pages come from the text layer instead of the provider
+        parts += ("native", config.native_routing) + tuple(sorted(config.native_router.items()))
+    return parts
+
+
+def _sub_document(file_bytes, pages):
+    """A PDF holding only the given 0-based pages of ``file_bytes``, in that order."""
+    with open_document(file_bytes) as pdf_document, fitz.open() as sub_document:
+        for page_num in pages:
+            sub_document.insert_pdf(pdf_document, from_page=page_num, to_page=page_num)
+        return sub_document.tobytes()
+
+
+def reocr_pages(file_bytes, file_name, result, provider, pages, config=None):
+    """OCR only ``pages`` (0-based) of a PDF again with ``provider`` and splice them into ``result``.
+
+    The pages are cut into a smaller PDF, so the provider never sees the rest
+    of the document. A page's new text replaces the old one only when it
+    scores higher, and takes its word boxes and layout with it. ``result``
+    must hold the text of every page, because the document text is rebuilt
+    from them. Returns the pages that were replaced.
+    """
+    config = config or EngineConfig()
+    if not pages:
+        return []
+    missing = [page_num for page_num in range(pdf_page_count(file_bytes)) if page_num not in result.page_texts]
+    if missing:
+        # Rebuilding from a partial page set would drop these pages from the text
+        logging.warning(f"{result.provider}: no text recorded for pages {[page_num + 1 for page_num in missing]}, "
+                        f"skipping re-OCR")
+        return []
+    # Routing would read the low pages from the same text layer again
+    sub_config = replace(config, reocr_provider=None, native_routing=False)
+    sub_result = run_ocr(_sub_document(file_bytes, pages), file_name, provider, sub_config)
+    result.errors.extend(f"Re-OCR with {provider}: {error}" for error in sub_result.errors)
+
+    replaced = []
+    for sub_page, page_num in enumerate(pages):
+        text = sub_result.page_texts.get(sub_page)
+        new_score = sub_result.page_metrics.score(sub_page)
+        old_score = result.page_metrics.score(page_num)
+        if text is None or new_score is None or (old_score is not None and new_score <= old_score):
+            continue
+        result.page_texts[page_num] = text
+        # Word boxes and layout of the discarded text must not outlive it
+        for pages_data, sub_pages_data in ((result.page_words, sub_result.page_words),
+                                           (result.page_layouts, sub_result.page_layouts)):
+            if sub_page in sub_pages_data:
+                pages_data[page_num] = sub_pages_data[sub_page]
+            else:
+                pages_data.pop(page_num, None)
+        words = result.page_words.get(page_num)
+        result.page_metrics.record(page_num, text, words.mean_confidence() if words is not None else None)
+        result.failed_pages.discard(page_num)
+        result.reocr_pages[page_num] = provider
+        replaced.append(page_num)
+    if replaced:
+        result.text = "\n\n".join(result.page_texts[page_num] for page_num in sorted(result.page_texts)
+                                   if result.page_texts[page_num])
+        logging.info(f"{result.provider}: pages {[page_num + 1 for page_num in replaced]} replaced by {provider}")
+    return replaced
+
+
+def _escalate_document(file_bytes, file_name, result, provider, config):
+    """Whole-document counterpart of :func:`reocr_pages`, for images and for first runs with no text.
+
+    ``provider``'s output replaces ``result``'s when ``result`` has no text or
+    the new page 0 scores higher. Returns the pages that were replaced.
+    """
+    sub_result = run_ocr(file_bytes, file_name, provider, replace(config, reocr_provider=None))
+    result.errors.extend(f"Re-OCR with {provider}: {error}" for error in sub_result.errors)
+    if not sub_result.text:
+        return []
+    if result.text:
+        new_score, old_score = sub_result.page_metrics.score(0), result.page_metrics.score(0)
+        if new_score is None or (old_score is not None and new_score <= old_score):
+            return []
+    result.text = sub_result.text
+    result.page_texts = dict(sub_result.page_texts)
+    result.page_metrics = sub_result.page_metrics
+    result.failed_pages = set(sub_result.failed_pages)
+    result.page_words = sub_result.page_words
+    result.page_layouts = sub_result.page_layouts
+    replaced = sorted(result.page_texts)
+    result.reocr_pages.update((page_num, provider) for page_num in replaced)
+    return replaced
+
+
+def _affordable_pages(provider, pages, cascade, spent, elapsed, concurrency):
+    """How many of ``pages`` ``provider`` can take within the remaining cost and time budget."""
+    count = len(pages)
+    page_cost = cascade["page_cost"].get(provider, 0.0)
+    if page_cost:
+        count = min(count, int((cascade["max_cost"] - spent) / page_cost + 1e-9))
+    page_seconds = cascade["page_seconds"].get(provider, 0.0)
+    if page_seconds:
+        # Pages of one batch run ``concurrency`` at a time
+        count = min(count, int(max(cascade["max_seconds"] - elapsed, 0.0) / page_seconds) * max(concurrency, 1))
+    return max(count, 0)
+
+
+def run_cascade(file_bytes, file_name, config=None, on_progress=None):
+    """Run a document on the cheap first engine and escalate only its low pages.
+
+    Pages scoring below ``cascade["min_score"]`` go, worst first, to the
+    providers in ``cascade["escalate"]`` that have an API key, as far as the
+    document's ``max_cost`` and ``max_seconds`` allow; a page a provider could
+    not fix moves on to the next one. Low pages without text that render to no
+    ink are blank and never escalated. The result is the first engine's with
+    the escalated pages spliced in, and ``result.cascade`` records what was
+    escalated, what it cost, which pages were blank and which were left for
+    lack of budget.
+    """
+    config = config or EngineConfig()
+    cascade = config.cascade
+    min_score = cascade["min_score"]
+    started = time.perf_counter()
+
+    result = run_ocr(file_bytes, file_name, cascade["first"], replace(config, reocr_provider=None), on_progress)
+    result.provider = CASCADE_PROVIDER
+    first_seconds = time.perf_counter() - started
+    is_pdf = file_name.lower().endswith('.pdf')
+
+    if result.ok:
+        pending = result.page_metrics.low_pages(min_score)
+    elif file_bytes:
+        # The first engine produced nothing, so every page needs escalating
+        try:
+            pending = list(range(pdf_page_count(file_bytes))) if is_pdf else [0]
+        except Exception as e:
+            logging.error(f"Cascade: could not count pages: {e}")
+            result.errors.append(f"Could not read document for escalation: {e}")
+            pending = []
+    else:
+        pending = []
+    blank = []
+    empty = [page_num for page_num in pending if not (result.page_texts.get(page_num) or "").strip()]
+    if empty:
+        try:
+            blank = blank_pages(file_bytes, empty, is_pdf)
+        except Exception as e:
+            logging.warning(f"Cascade: could not check for blank pages: {e}")
+    if blank and (result.ok or len(blank) == len(pending)):
+        # Without a first text the whole document escalates, unless it is all blank
+        logging.info(f"Cascade: pages {[page_num + 1 for page_num in blank]} are blank, not escalating them")
+        pending = [page_num for page_num in pending if page_num not in blank]
+    pending.sort(key=lambda page_num: result.page_metrics.score(page_num) or 0.0)
+    low_pages = sorted(pending)
+    # Without a first text, or for an image, a provider must take the whole document
+    whole_document = not is_pdf or not result.ok
+
+    spent = 0.0
+    escalated = {}
+    replaced = []
+    for provider in cascade["escalate"]:
+        if not pending:
+            break
+        if not config.api_keys.get(provider):
+            continue
+        count = _affordable_pages(provider, pending, cascade, spent, time.perf_counter() - started,
+                                  config.concurrency.get(provider, 1))
+        if not count or (whole_document and count < len(pending)):
+            continue
+        batch = pending[:count]
+        logging.info(f"Cascade: escalating {len(batch)} of {len(pending)} low pages to {provider}")
+        if whole_document:
+            replaced += _escalate_document(file_bytes, file_name, result, provider, config)
+            whole_document = not is_pdf or not result.ok
+        else:
+            replaced += reocr_pages(file_bytes, file_name, result, provider, sorted(batch), config)
+        spent += len(batch) * cascade["page_cost"].get(provider, 0.0)
+        escalated[provider] = sorted(page_num + 1 for page_num in batch)
+        pending = [page_num for page_num in pending
+                   if page_num not in batch or (result.page_metrics.score(page_num) or 0.0) < min_score]
+
+    result.cascade = {
+        "first": cascade["first"],
+        "low_pages": [page_num + 1 for page_num in low_pages],
+        "blank": [page_num + 1 for page_num in sorted(blank)],
+        "escalated": escalated,
+        "replaced": sorted(page_num + 1 for page_num in set(replaced)),
+        "unresolved": sorted(page_num + 1 for page_num in pending),
+        "cost": round(spent, 6),
+    }
+    result.timings["first"] = first_seconds
+    result.timings["total"] = time.perf_counter() - started
+    return result
+
+
+def _finish_run(run, file_bytes, file_name):
+    """Score a single-image result as page 0 and re-OCR low pages when configured."""
+    result, config = run.result, run.config
+    if result.text and not len(result.page_metrics):
+        run.record_page(0, result.text)
+    if _reocr_parts(config, result.provider) and file_name.lower().endswith('.pdf') and result.text:
+        low_pages = result.page_metrics.low_pages(config.min_page_score)
+        if low_pages:
+            logging.info(f"{result.provider}: {len(low_pages)} pages below {config.min_page_score}, "
+                         f"re-running them with {config.reocr_provider}")
+            reocr_pages(file_bytes, file_name, result, config.reocr_provider, low_pages, config)
+
+
+def _load_cached_result(result, config, file_bytes):
+    """Fill ``result`` from the document cache; returns the cache key, or None when caching is off."""
+    if not config.use_cache:
+        return None
+    cache_key = document_key(file_bytes, result.provider, result.model, *_output_parts(config, result.provider),
+                             *_reocr_parts(config, result.provider))
+    cached = get_result_cache().get(cache_key)
+    if cached is not None:
+        result.text = cached["text"]
+        result.page_words = {int(page_num): WordBoxes.from_dict(words)
+                             for page_num, words in cached.get("page_words", {}).items()}
+        result.page_layouts = {int(page_num): layout_from_dict(layout)
+                               for page_num, layout in cached.get("page_layouts", {}).items()}
+        result.page_texts = {int(page_num): text for page_num, text in cached.get("page_texts", {}).items()}
+        if "page_metrics" in cached:
+            result.page_metrics = PageMetrics.from_dict(cached["page_metrics"])
+        result.reocr_pages = {int(page_num): provider for page_num, provider in cached.get("reocr_pages", {}).items()}
+        result.from_cache = True
+    return cache_key
+
+
+def _store_result(result, cache_key):
+    if result.errors or result.failed_pages:
+        # A partial result would be served as complete and its gaps never retried
+        logging.info(f"{result.provider}: not caching a result with errors or failed pages")
+        return
+    if result.text and cache_key:
+        entry = {"text": result.text}
+        if result.page_words:
+            entry["page_words"] = {page_num: words.to_dict() for page_num, words in result.page_words.items()}
+        if result.page_layouts:
+            entry["page_layouts"] = {page_num: layout.to_dict() for page_num, layout in result.page_layouts.items()}
+        if len(result.page_metrics):
+            entry["page_texts"] = result.page_texts
+            entry["page_metrics"] = result.page_metrics.to_dict()
+        if result.reocr_pages:
+            entry["reocr_pages"] = result.reocr_pages
+        get_result_cache().set(cache_key, entry)
+
+
+def run_ocr(file_bytes, file_name, provider, config=None, on_progress=None):
+    """Run one document through the result cache and the selected provider.
+
+    ``on_progress(done, total)`` is called after every finished page chunk.
+    Never raises for provider failures: they are reported in ``OCRResult.errors``.
+    The "Cascade" provider runs :func:`run_cascade`.
+    """
+    if provider == CASCADE_PROVIDER:
+        return run_cascade(file_bytes, file_name, config, on_progress)
+    config = config or EngineConfig()
+    result = OCRResult(provider=provider, model=config.models.get(provider))
+    started = time.perf_counter()
+
+    if not file_bytes:
+        result.errors.append("Empty file provided")
+        return result
+
+    cache_key = _load_cached_result(result, config, file_bytes)
+    if result.from_cache:
+        result.timings["total"] = time.perf_counter() - started
+        return result
+
+    run = _Run(provider, config, result, on_progress)
+    try:
+        client = get_client(provider, config.api_keys.get(provider))
+        result.timings["client"] = time.perf_counter() - started
+        processor = PROCESSORS[provider]
+        result.text = processor(client, file_bytes, file_name, result.model, run)
+        _finish_run(run, file_bytes, file_name)
+    except ProviderError as e:
+        run.error(str(e))
+    except Exception as e:
+        logging.error(f"{provider} processing error: {e}", exc_info=True)
+        result.errors.append(f"{provider} processing error: {str(e)}")
+
+    result.timings["total"] = time.perf_counter() - started
+    _store_result(result, cache_key)
+    return result
+
+
+async def run_ocr_async(file_bytes, file_name, provider, config=None):
+    """Awaitable :func:`run_ocr` for batch jobs running many documents at once.
+
+    Providers in ``ASYNC_PROCESSORS`` are awaited natively; every other
+    provider runs :func:`run_ocr` in a worker thread.
+    """
+    if provider not in ASYNC_PROCESSORS:
+        return await asyncio.to_thread(run_ocr, file_bytes, file_name, provider, config)
+
+    config = config or EngineConfig()
+    result = OCRResult(provider=provider, model=config.models.get(provider))
+    started = time.perf_counter()
+
+    if not file_bytes:
+        result.errors.append("Empty file provided")
+        return result
+
+    cache_key = _load_cached_result(result, config, file_bytes)
+    if result.from_cache:
+        result.timings["total"] = time.perf_counter() - started
+        return result
+
+    run = _Run(provider, config, result)
+    try:
+        client = get_client(provider, config.api_keys.get(provider))
+        result.text = await ASYNC_PROCESSORS[provider](client, file_bytes, file_name, result.model, run)
+        await asyncio.to_thread(_finish_run, run, file_bytes, file_name)
+    except ProviderError as e:
+        run.error(str(e))
+    except Exception as e:
+        logging.error(f"{provider} processing error: {e}", exc_info=True)
+        result.errors.append(f"{provider} processing error: {str(e)}")
+
+    result.timings["total"] = time.perf_counter() - started
+    _store_result(result, cache_key)
+    return result
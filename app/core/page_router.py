@@ -0,0 +1,106 @@
+"""Per-page routing between a PDF's own text layer and OCR.
+
+Born-digital pages already carry their text; rasterizing them and paying an
+OCR engine to read it back is slow and costs money. :func:`route_pages` looks
+at each page with PyMuPDF, without rendering anything: how much text the page
+has, whether it uses fonts, how much of it is covered by images, and how much
+of its text is unmappable glyphs. Pages that look digital are read natively;
+scanned or image-dominant pages are left for OCR. :func:`blank_pages` finds
+pages with nothing on them, which no engine can improve.
+"""
+import io
+from dataclasses import dataclass
+
+import fitz
+import numpy as np
+from PIL import Image
+
+from app.core.doc_handles import open_document
+
+
+@dataclass
+class PageProfile:
+    """What a page is made of, as seen by PyMuPDF."""
+    page: int
+    chars: int
+    fonts: int
+    text_coverage: float
+    image_coverage: float
+    bad_char_ratio: float
+
+    def is_digital(self, min_chars=20, max_image_coverage=0.5, max_bad_char_ratio=0.05):
+        return (self.fonts > 0 and self.chars >= min_chars
+                and self.image_coverage <= max_image_coverage
+                and self.bad_char_ratio <= max_bad_char_ratio)
+
+
+def _covered_fraction(rects, page_rect):
+    area = abs(page_rect)
+    if not area:
+        return 0.0
+    return min(1.0, sum(abs(rect & page_rect) for rect in rects) / area)
+
+
+def profile_page(page):
+    """Return ``(PageProfile, text)`` for a PyMuPDF page."""
+    blocks = [block for block in page.get_text("blocks") if block[6] == 0]
+    text = "".join(block[4] for block in blocks)
+    stripped = "".join(text.split())
+    page_rect = page.rect
+    profile = PageProfile(
+        page=page.number,
+        chars=len(stripped),
+        fonts=len(page.get_fonts()),
+        text_coverage=_covered_fraction((fitz.Rect(block[:4]) for block in blocks), page_rect),
+        image_coverage=_covered_fraction((fitz.Rect(info["bbox"]) for info in page.get_image_info()), page_rect),
+        bad_char_ratio=stripped.count("\ufffd") / len(stripped) if stripped else 0.0,
+    )
+    return profile, text
+
+
+def route_pages(file_bytes, pages, min_chars=20, max_image_coverage=0.5, max_bad_char_ratio=0.05):
+    """Split 0-based ``pages`` into natively readable and OCR-bound ones.
+
+    Returns ``(native, ocr)``: ``native`` maps each digital page to its text
+    layer, ``ocr`` lists the pages that still need an OCR engine, in order.
+    """
+    native = {}
+    ocr = []
+    with open_document(file_bytes) as pdf_document:
+        for page_num in pages:
+            profile, text = profile_page(pdf_document[page_num])
+            if profile.is_digital(min_chars, max_image_coverage, max_bad_char_ratio):
+                native[page_num] = text.strip()
+            else:
+                ocr.append(page_num)
+    return native, ocr
+
+
+def _ink_fraction(gray):
+    """Fraction of pixels visibly darker than paper in an 8-bit grayscale array."""
+    return np.count_nonzero(gray < 200) / gray.size if gray.size else 0.0
+
+
+def blank_pages(file_bytes, pages, is_pdf=True, dpi=36, max_ink=0.0005):
+    """The 0-based ``pages`` that have no text layer and render to (almost) no ink.
+
+    Pages are rendered in grayscale at a low ``dpi`` and count as blank when at
+    most ``max_ink`` of their pixels carry ink; a page with a few short lines
+    still has ten times that. An image file is page 0.
+    """
+    if not is_pdf:
+        with Image.open(io.BytesIO(file_bytes)) as image:
+            image = image.convert("L")
+            image.thumbnail((512, 512))
+            return [0] if 0 in pages and _ink_fraction(np.asarray(image)) <= max_ink else []
+    blank = []
+    with open_document(file_bytes) as pdf_document:
+        for page_num in pages:
+            page = pdf_document[page_num]
+            if page.get_text("text").strip():
+                continue
+            pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+            gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+            if _ink_fraction(gray) <= max_ink:
+                blank.append(page_num)
+    return blank
@@ -0,0 +1,158 @@
+"""Chunked processing pipeline for documents of arbitrary length.
+
+Pages are processed in fixed-size windows. Each finished window is written to
+a checkpoint directory as soon as it completes, so a failure part-way through a
+long document resumes from the last finished chunk instead of page 1. A run
+holds a lock on its checkpoint, so two runs of the same document never share
+one; the second runs without a checkpoint.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from constants import PDF_CHUNK_PAGES, CHECKPOINT_DIR
+
+
+def document_key(file_bytes, *parts):
+    """Return a stable key for a document plus the settings that shape its output."""
+    digest = hashlib.sha256(file_bytes)
+    for part in parts:
+        digest.update(b"\0" + str(part).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def iter_chunks(num_pages, chunk_size):
+    """Yield 0-based ``(start, end)`` page windows, ``end`` exclusive."""
+    for start in range(0, num_pages, chunk_size):
+        yield start, min(start + chunk_size, num_pages)
+
+
+class ChunkCheckpoint:
+    """Per-run directory holding the output of every finished chunk.
+
+    A chunk is saved as its text plus optional per-page entries, so a resumed
+    run can restore page-level data as well as the stitched text.
+    """
+
+    def __init__(self, key, root=None):
+        self.path = os.path.join(root or CHECKPOINT_DIR, key)
+        self._lock_file = None
+
+    def acquire(self):
+        """Take the checkpoint for this run; returns False while another run holds it."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        lock_file = open(self.path + ".lock", "a")
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def release(self):
+        if self._lock_file is None:
+            return
+        if fcntl is None:
+            msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        # The lock file stays: removing it would let two runs lock different files
+        self._lock_file.close()
+        self._lock_file = None
+
+    def _chunk_path(self, chunk_idx):
+        return os.path.join(self.path, f"chunk_{chunk_idx:05d}.json")
+
+    def load(self, chunk_idx):
+        """Return ``{"text": ..., "pages": {...}}`` for a finished chunk, or None if it has not finished yet."""
+        try:
+            with open(self._chunk_path(chunk_idx), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, chunk_idx, text, pages=None):
+        """Atomically record the output of a finished chunk and its per-page entries."""
+        os.makedirs(self.path, exist_ok=True)
+        final_path = self._chunk_path(chunk_idx)
+        tmp_path = final_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"text": text, "pages": pages or {}}, f)
+        os.replace(tmp_path, final_path)
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def run_chunked(file_bytes, num_pages, process_range, key_parts=(), chunk_size=None,
+                checkpoint_dir=None, on_chunk=None, on_failure=None, page_entries=None, on_restore=None,
+                is_complete=None):
+    """Process a document in page windows with checkpointing.
+
+    ``process_range(start, end)`` handles the 0-based pages ``start..end-1`` and
+    returns their text, or None on failure. A failed chunk stops the run,
+    calls ``on_failure(start, end)`` and leaves earlier chunks checkpointed; the
+    next run with the same document and ``key_parts`` picks up from there.
+    Finished chunks are also kept in memory, so the checkpoint is only read to
+    resume. ``page_entries(start, end)`` returns JSON-able per-page data to
+    checkpoint with a chunk's text, keyed by page number; ``on_restore(pages)``
+    receives it back when a chunk is loaded from the checkpoint, with the keys
+    as strings. A chunk for which ``is_complete(start, end)`` is False (some of
+    its pages failed) is used but not checkpointed, and the checkpoint is kept
+    after the run, so a retry processes that chunk again and replays the rest.
+    ``on_chunk(done, total)`` is called after every chunk. Returns the joined
+    text, or None if the run did not complete.
+    """
+    if num_pages <= 0:
+        return None
+
+    chunk_size = chunk_size or PDF_CHUNK_PAGES
+    checkpoint = ChunkCheckpoint(document_key(file_bytes, chunk_size, *key_parts), checkpoint_dir)
+    if not checkpoint.acquire():
+        logging.info(f"Checkpoint {checkpoint.path} is held by another run; processing without one")
+        checkpoint = None
+    chunks = list(iter_chunks(num_pages, chunk_size))
+
+    texts = []
+    incomplete = []
+    try:
+        for chunk_idx, (start, end) in enumerate(chunks):
+            saved = checkpoint.load(chunk_idx) if checkpoint else None
+            if saved is None:
+                text = process_range(start, end)
+                if text is None:
+                    logging.error(f"Chunk {chunk_idx + 1}/{len(chunks)} (pages {start + 1}-{end}) failed"
+                                  + (f"; progress kept in {checkpoint.path}" if checkpoint else ""))
+                    if on_failure:
+                        on_failure(start, end)
+                    return None
+                if is_complete and not is_complete(start, end):
+                    incomplete.append(chunk_idx)
+                elif checkpoint:
+                    checkpoint.save(chunk_idx, text, page_entries(start, end) if page_entries else None)
+            else:
+                logging.info(f"Resuming: chunk {chunk_idx + 1}/{len(chunks)} loaded from checkpoint")
+                text = saved["text"]
+                if on_restore:
+                    on_restore(saved["pages"])
+            texts.append(text)
+            if on_chunk:
+                on_chunk(chunk_idx + 1, len(chunks))
+        if incomplete:
+            logging.warning(f"{len(incomplete)} chunks had failed pages and were not checkpointed")
+        elif checkpoint:
+            checkpoint.clear()
+    finally:
+        if checkpoint:
+            checkpoint.release()
+    return "\n\n".join(text for text in texts if text)
@@ -0,0 +1,111 @@
+"""Cached page renderer for the document preview.
+
+Streamlit reruns the whole page on every widget change, so the preview asks
+for the same page image over and over. :class:`PreviewRenderer` keeps encoded
+page images in a memory-bounded LRU keyed by (document hash, page, zoom). It
+can render a cheap low-resolution thumbnail to show while the full page is
+rendered, and it prefetches the neighbouring pages on a background thread, so
+stepping through a long PDF is served from memory. Every method takes the
+document hash as an optional ``doc_key``; the page computes it once per upload,
+so a rerun does not hash the whole file again.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz
+
+from app.core.doc_handles import open_document
+from app.core.pipeline import document_key
+from constants import PREVIEW_CACHE_BYTES, PREVIEW_PREFETCH_PAGES, PREVIEW_THUMBNAIL_ZOOM
+
+
+class PreviewRenderer:
+    """Memory-bounded LRU of rendered PNG pages with background prefetching."""
+
+    def __init__(self, max_bytes, thumbnail_zoom=0.35, prefetch_pages=2):
+        self.max_bytes = max_bytes
+        self.thumbnail_zoom = thumbnail_zoom
+        self.prefetch_pages = prefetch_pages
+        self._images = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preview-prefetch")
+
+    def _get(self, key):
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+            return image
+
+    def _put(self, key, image):
+        with self._lock:
+            if key in self._images:
+                return
+            self._images[key] = image
+            self._size += len(image)
+            while self._size > self.max_bytes and len(self._images) > 1:
+                _, old = self._images.popitem(last=False)
+                self._size -= len(old)
+
+    def _render(self, doc_key, file_bytes, page_index, zoom):
+        key = (doc_key, page_index, zoom)
+        image = self._get(key)
+        if image is None:
+            with open_document(file_bytes, doc_key=doc_key) as pdf_document:
+                pix = pdf_document[page_index].get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+                image = pix.tobytes("png")
+            self._put(key, image)
+        return image
+
+    def is_cached(self, file_bytes, page_index, zoom=1.0, doc_key=None):
+        return self._get((doc_key or document_key(file_bytes), page_index, zoom)) is not None
+
+    def page_image(self, file_bytes, page_index, zoom=1.0, doc_key=None):
+        """PNG bytes of the 0-based page at ``zoom`` (1.0 = 72 dpi, one pixel per point)."""
+        return self._render(doc_key or document_key(file_bytes), file_bytes, page_index, zoom)
+
+    def thumbnail(self, file_bytes, page_index, doc_key=None):
+        """Low-resolution PNG of the page, cheap enough to show while the full page renders."""
+        return self.page_image(file_bytes, page_index, self.thumbnail_zoom, doc_key)
+
+    def prefetch(self, file_bytes, page_index, page_count, zoom=1.0, doc_key=None):
+        """Render the pages after and before ``page_index`` in the background."""
+        doc_key = doc_key or document_key(file_bytes)
+        neighbours = []
+        for distance in range(1, self.prefetch_pages + 1):
+            neighbours += [page_index + distance, page_index - distance]
+        for neighbour in neighbours:
+            key = (doc_key, neighbour, zoom)
+            if not 0 <= neighbour < page_count or self._get(key) is not None:
+                continue
+            with self._lock:
+                if key in self._pending:
+                    continue
+                self._pending.add(key)
+            self._executor.submit(self._prefetch_one, doc_key, file_bytes, neighbour, zoom)
+
+    def _prefetch_one(self, doc_key, file_bytes, page_index, zoom):
+        try:
+            self._render(doc_key, file_bytes, page_index, zoom)
+        except Exception as e:
+            logging.warning(f"Preview prefetch of page {page_index + 1} failed: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard((doc_key, page_index, zoom))
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_preview_renderer():
+    """Return the process-wide preview renderer shared by all sessions."""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = PreviewRenderer(PREVIEW_CACHE_BYTES, PREVIEW_THUMBNAIL_ZOOM, PREVIEW_PREFETCH_PAGES)
+        return _renderer
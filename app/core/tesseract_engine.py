@@ -0,0 +1,237 @@
+"""Multi-core Tesseract engine.
+
+``pytesseract`` runs one tesseract subprocess per call, on one core. This
+module shards a document's pages across a process pool sized to the CPU count.
+Each worker renders and recognises its own slice of pages. The document is
+written to a temporary file once per call and each worker reads it once, so
+only its path and page numbers cross the process boundary. Workers are started
+with ``forkserver`` (``spawn`` where that is unavailable) rather than forked
+from a process that may hold threads and open documents. ``OMP_THREAD_LIMIT=1`` keeps
+every tesseract subprocess single-threaded, so N workers use N cores rather
+than oversubscribing them.
+
+In structured mode pages are read with ``image_to_data`` instead of
+``image_to_string``. That returns per-word boxes and confidences, kept
+column-wise in :class:`WordBoxes`, and the page text is rebuilt from the
+same data, so no second OCR pass is needed.
+"""
+import atexit
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pytesseract
+
+from app.core.documents import iter_pdf_pages
+from constants import TESSERACT_WORKERS
+
+
+class WordBoxes:
+    """Word-level Tesseract output for one page, stored column-wise.
+
+    Boxes are in pixels of an image rendered at ``dpi``; ``conf`` is Tesseract's
+    0-100 word confidence. ``block``/``par``/``line`` number the layout units
+    each word belongs to, in Tesseract's reading order.
+    """
+
+    COLUMNS = ("left", "top", "width", "height", "conf", "block", "par", "line")
+
+    def __init__(self, words, left, top, width, height, conf, block, par, line, dpi=72):
+        self.words = list(words)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.top = np.asarray(top, dtype=np.int32)
+        self.width = np.asarray(width, dtype=np.int32)
+        self.height = np.asarray(height, dtype=np.int32)
+        self.conf = np.asarray(conf, dtype=np.float32)
+        self.block = np.asarray(block, dtype=np.int32)
+        self.par = np.asarray(par, dtype=np.int32)
+        self.line = np.asarray(line, dtype=np.int32)
+        self.dpi = dpi
+
+    @classmethod
+    def from_tesseract(cls, data, dpi=72):
+        """Build from ``image_to_data(..., output_type=Output.DICT)``, keeping real words only."""
+        conf = np.asarray(data["conf"], dtype=np.float32)
+        keep = (np.asarray(data["level"]) == 5) & (conf >= 0)
+        keep &= np.fromiter((bool(t.strip()) for t in data["text"]), dtype=bool, count=len(conf))
+        idx = np.flatnonzero(keep)
+        return cls(
+            [data["text"][i] for i in idx],
+            np.asarray(data["left"])[idx], np.asarray(data["top"])[idx],
+            np.asarray(data["width"])[idx], np.asarray(data["height"])[idx],
+            conf[idx],
+            np.asarray(data["block_num"])[idx], np.asarray(data["par_num"])[idx], np.asarray(data["line_num"])[idx],
+            dpi=dpi,
+        )
+
+    def __len__(self):
+        return len(self.words)
+
+    def mean_confidence(self):
+        """Mean word confidence in [0, 1], or None for a page without words."""
+        return float(self.conf.mean()) / 100 if len(self) else None
+
+    def _group_starts(self, level):
+        """Indices where a new word/line/block run begins (words of a unit are contiguous)."""
+        if level == "word":
+            return np.arange(len(self))
+        keys = [self.block] if level == "block" else [self.block, self.par, self.line]
+        changed = np.zeros(len(self), dtype=bool)
+        changed[0] = True
+        for key in keys:
+            changed[1:] |= key[1:] != key[:-1]
+        return np.flatnonzero(changed)
+
+    def to_text(self):
+        """Rebuild page text: words joined per line, blank line between paragraphs."""
+        if not len(self):
+            return ""
+        parts = []
+        for i, word in enumerate(self.words):
+            if i:
+                if self.block[i] != self.block[i - 1] or self.par[i] != self.par[i - 1]:
+                    parts.append("\n\n")
+                elif self.line[i] != self.line[i - 1]:
+                    parts.append("\n")
+                else:
+                    parts.append(" ")
+            parts.append(word)
+        return "".join(parts)
+
+    def to_elements(self, level="line", min_conf=60):
+        """Return visualization elements (bbox in PDF points, type, confidence) per unit."""
+        if not len(self):
+            return []
+        starts = self._group_starts(level)
+        scale = 72 / self.dpi
+        x0 = np.minimum.reduceat(self.left, starts) * scale
+        y0 = np.minimum.reduceat(self.top, starts) * scale
+        x1 = np.maximum.reduceat(self.left + self.width, starts) * scale
+        y1 = np.maximum.reduceat(self.top + self.height, starts) * scale
+        conf = np.add.reduceat(self.conf, starts) / np.diff(np.append(starts, len(self)))
+        return [
+            {
+                "type": "low_confidence" if unit_conf < min_conf else "text",
+                "bbox": (float(left), float(top), float(right), float(bottom)),
+                "confidence": float(unit_conf) / 100,
+            }
+            for left, top, right, bottom, unit_conf in zip(x0, y0, x1, y1, conf)
+        ]
+
+    def to_dict(self):
+        data = {name: getattr(self, name).tolist() for name in self.COLUMNS}
+        data.update(words=self.words, dpi=self.dpi)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["words"], *(data[name] for name in cls.COLUMNS), dpi=data.get("dpi", 72))
+
+
+@dataclass
+class PageText:
+    """Recognised text of one page and how long recognition took."""
+    page: int
+    text: str
+    seconds: float
+    words: WordBoxes = None
+
+
+def recognize_image(image, lang='eng', structured=False, dpi=72):
+    """OCR one image; returns ``(text, words)`` with ``words`` None unless structured."""
+    if not structured:
+        return pytesseract.image_to_string(image, lang=lang), None
+    data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+    words = WordBoxes.from_tesseract(data, dpi)
+    return words.to_text(), words
+
+
+def _init_worker(tesseract_cmd):
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+
+# The document a worker last read, as ``(path, bytes)``
+_worker_document = (None, None)
+
+
+def _read_document(path):
+    global _worker_document
+    if _worker_document[0] != path:
+        with open(path, 'rb') as f:
+            _worker_document = (path, f.read())
+    return _worker_document[1]
+
+
+def _ocr_shard_file(path, pages, lang, dpi, colorspace, structured):
+    return _ocr_shard(_read_document(path), pages, lang, dpi, colorspace, structured)
+
+
+def _ocr_shard(file_bytes, pages, lang, dpi, colorspace, structured):
+    results = []
+    for page_num, image in zip(pages, iter_pdf_pages(file_bytes, dpi=dpi, colorspace=colorspace, pages=pages)):
+        started = time.perf_counter()
+        text, words = recognize_image(image, lang, structured, dpi)
+        results.append(PageText(page_num, text, time.perf_counter() - started, words))
+    return results
+
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def get_pool(max_workers=None):
+    """Return the shared worker pool, (re)creating it for a different size."""
+    global _pool, _pool_workers
+    max_workers = max_workers or TESSERACT_WORKERS
+    with _pool_lock:
+        if _pool is None or _pool_workers != max_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(method),
+                                        initializer=_init_worker,
+                                        initargs=(pytesseract.pytesseract.tesseract_cmd,))
+            _pool_workers = max_workers
+        return _pool
+
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+def ocr_pdf_pages(file_bytes, pages, lang='eng', dpi=72, colorspace="gray", max_workers=None,
+                  structured=False):
+    """Recognise the given 0-based PDF pages; returns a :class:`PageText` per page, in order.
+
+    With ``structured`` each page also carries its :class:`WordBoxes`.
+    With ``max_workers == 1`` everything runs in the calling process, which is
+    what callers that already parallelise across documents should use.
+    """
+    pages = list(pages)
+    max_workers = max_workers or TESSERACT_WORKERS
+    if max_workers <= 1 or len(pages) <= 1:
+        return _ocr_shard(file_bytes, pages, lang, dpi, colorspace, structured)
+
+    # Twice as many shards as workers evens out pages that take longer than others
+    shard_size = max(1, -(-len(pages) // (max_workers * 2)))
+    pool = get_pool(max_workers)
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(file_bytes)
+    try:
+        futures = [pool.submit(_ocr_shard_file, f.name, pages[i:i + shard_size], lang, dpi, colorspace, structured)
+                   for i in range(0, len(pages), shard_size)]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+    finally:
+        os.remove(f.name)
@@ -12,6 +12,7 @@ def render():
             for provider, data in st.session_state.ocr_results.items():
                 with st.expander(f"{provider} Quality Metrics", expanded=True):
                     display_quality_metrics(data.get("quality_score"), data.get("metrics"))
+                    display_page_summary(data.get("pages"))
         
         with tab2:
             st.subheader("Results Comparison")
@@ -55,3 +56,17 @@ def display_quality_metrics(score, metrics):
                 "Format": metrics.get("format_retention", 0)
             }.items():
                 st.metric(name, f"{value:.1%}")
+
+def display_page_summary(pages):
+    """Show per-page score aggregates and the pages flagged as low quality"""
+    if not pages:
+        return
+    st.markdown(f"**Pages:** {pages['pages']} · mean page score {pages['mean_score']:.1%} · "
+                f"lowest {pages['min_score']:.1%}")
+    if pages["low_pages"]:
+        st.warning("Low-quality pages: " + ", ".join(map(str, pages["low_pages"])))
+    if pages.get("blank_pages"):
+        st.caption("Blank pages: " + ", ".join(map(str, pages["blank_pages"])))
+    if pages.get("reocr_pages"):
+        st.caption("Re-OCR'd: " + ", ".join(f"page {page} with {provider}"
+                                           for page, provider in pages["reocr_pages"].items()))
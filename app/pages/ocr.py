@@ -1,8 +1,11 @@
 import streamlit as st
 import os
 import io  # Add io import
-from utils import render_pdf_page, safe_pdf_open
+from utils import render_pdf_page, reset_result_state, safe_pdf_open
+from app.core.pipeline import document_key
+from app.core.preview import get_preview_renderer
 from ocr_providers import process_file_ocr
+from constants import API_KEY_NAMES, CASCADE, NATIVE_TEXT_ROUTING, PROVIDERS
 
 def render():
     st.title("OCR Processing")
@@ -46,16 +49,13 @@ def render():
             
         provider = st.selectbox(
             "OCR Provider",
-            options=["NVIDIA", "Mistral", "Google", "Tesseract", "PyMuPDF", "PyPDF2"],
-            help="Choose your OCR provider"
+            options=PROVIDERS,
+            help="Choose your OCR provider. Cascade runs Tesseract first and sends only low-quality pages to a cloud provider."
         )
         
         # Clear results if provider changed
         if st.session_state.last_provider != provider:
-            if "result" in st.session_state.app_state:
-                del st.session_state.app_state["result"]
-            if "quality" in st.session_state.app_state:
-                del st.session_state.app_state["quality"]
+            reset_result_state()
             if provider in st.session_state.ocr_results:
                 del st.session_state.ocr_results[provider]
             st.session_state.last_provider = provider
@@ -69,8 +69,15 @@ def render():
         elif provider == "NVIDIA":
             api_key_exists = bool(st.secrets.get("NVIDIA_API_KEY"))
 
-        if provider in ["Mistral", "Google", "NVIDIA"]: # Cloud providers
-            if api_key_exists:
+        if provider in ["Mistral", "Google", "NVIDIA", "Cascade"]: # Cloud providers
+            if provider == "Cascade":
+                escalation = [name for name in CASCADE["escalate"] if st.secrets.get(API_KEY_NAMES[name])]
+                if escalation:
+                    st.info(f"{CASCADE['first']} first; low-quality pages escalate to {', '.join(escalation)} "
+                            f"(budget ${CASCADE['max_cost']:.2f}, {CASCADE['max_seconds']:.0f}s per document)")
+                else:
+                    st.warning("No cloud API key found: Cascade will only run the local engine")
+            elif api_key_exists:
                 st.info(f"✓ {provider} API key found")
             else:
                 st.error(f"✗ {provider} API key missing")
@@ -81,6 +88,14 @@ def render():
             )
         else:
             privacy_consent = True
+
+        if provider in ["Google", "NVIDIA", "Tesseract", "Cascade"]: # Image-based engines
+            st.toggle(
+                "Read digital pages from the text layer",
+                value=NATIVE_TEXT_ROUTING,
+                key="native_routing",
+                help="Pages that already carry text skip OCR; only scanned pages go to the engine"
+            )
         
         process_button = st.button(
             "Process Document", 
@@ -88,6 +103,16 @@ def render():
             disabled=not (uploaded_file and privacy_consent)
         )
 
+    # A new upload invalidates everything derived from the previous document
+    upload_id = getattr(uploaded_file, "file_id", None) if uploaded_file else None
+    processing = st.session_state.app_state["processing"]
+    if processing["current_file"] != upload_id:
+        reset_result_state()
+        st.session_state.ocr_results = {}
+        processing["current_file"] = upload_id
+        # Hashed once per upload; the preview reuses it on every rerun
+        processing["document_key"] = document_key(uploaded_file.getvalue()) if uploaded_file else None
+
     # Document Preview and Results Row
     if uploaded_file:
         file_bytes = uploaded_file.getvalue()
@@ -100,12 +125,22 @@ def render():
             if uploaded_file.type.startswith('image'):
                 st.image(file_bytes, caption="Uploaded Image", use_container_width=True)
             elif uploaded_file.type == "application/pdf":
-                num_pages = safe_pdf_open(file_bytes)
+                doc_key = processing["document_key"]
+                num_pages = safe_pdf_open(file_bytes, doc_key)
                 if num_pages > 0:
                     page_num = st.select_slider("Preview Page", options=range(1, num_pages + 1), format_func=lambda x: f"Page {x}/{num_pages}")
-                    page_image = render_pdf_page(file_bytes, page_num)
+                    page_elements = st.session_state.app_state["processing"].get("parsed_elements", {}).get(page_num)
+                    show_boxes = bool(page_elements) and st.checkbox("Show detected layout", help="Blocks found by PyMuPDF or lines recognised by Tesseract; magenta marks low confidence")
+                    renderer = get_preview_renderer()
+                    preview = st.empty()
+                    if not renderer.is_cached(file_bytes, page_num - 1, doc_key=doc_key):
+                        # Show a cheap thumbnail while the full page renders
+                        preview.image(renderer.thumbnail(file_bytes, page_num - 1, doc_key), use_container_width=True)
+                    page_image = render_pdf_page(file_bytes, page_num, elements=page_elements if show_boxes else None,
+                                                 doc_key=doc_key)
                     if page_image:
-                        st.image(page_image, use_container_width=True)
+                        preview.image(page_image, use_container_width=True)
+                    renderer.prefetch(file_bytes, page_num - 1, num_pages, doc_key=doc_key)
 
         with col_results:
             st.markdown("### 📋 Extracted Content")
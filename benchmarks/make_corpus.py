@@ -0,0 +1,140 @@
+"""Generate the pinned benchmark corpus, its references and recorded responses.
+
+Usage:
+    python -m benchmarks.make_corpus
+
+Writes the documents and ground-truth transcripts under ``benchmarks/corpus/``
+plus ``manifest.json`` pinning each file's SHA-256. It also writes one
+recording per cloud provider under ``benchmarks/recordings/``, holding a
+response per page in that provider's wire format. These recordings are
+synthetic: they carry the reference text with a nominal latency. Responses
+captured from a real run can replace them as long as the format is kept. The
+generated files are committed, so benchmarks only need to rerun this when the
+corpus itself changes; a re-render with another PyMuPDF version changes the
+hashes.
+"""
+import hashlib
+import json
+import os
+
+import fitz
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "corpus")
+RECORDINGS_DIR = os.path.join(os.path.dirname(__file__), "recordings")
+
+# Nominal seconds per page, replayed when the harness runs with --latency-scale
+NOMINAL_LATENCY = {"Mistral": 1.2, "Google": 2.5, "NVIDIA": 1.8}
+
+PARAGRAPH = ("Optical character recognition converts images of typed or printed text into "
+             "machine-encoded text. Quality depends on resolution, contrast and the layout "
+             "of the page, so every engine is measured on the same documents.")
+
+DOCUMENTS = {
+    "digital_report.pdf": [
+        ["Quarterly Operations Report", "", PARAGRAPH, "", "Regional summary",
+         "North 1,204 units shipped", "South 987 units shipped", "East 1,530 units shipped"],
+        ["Methodology", "", PARAGRAPH, "", PARAGRAPH],
+        ["Findings", "", "Throughput rose eleven percent over the previous quarter.",
+         "Defect rates fell to 0.8 percent.", "", PARAGRAPH],
+        ["Appendix", "", "All figures are unaudited and subject to revision."],
+    ],
+    "scanned_letter.pdf": [
+        ["Dear Customer,", "", "Thank you for your order number 48213.",
+         "Your shipment left our warehouse on 12 March.", "", "Kind regards,", "The Dispatch Team"],
+        ["Returns are accepted within thirty days of delivery.",
+         "Please keep the original packaging and receipt."],
+    ],
+    "mixed.pdf": [
+        ["Invoice 2291", "", "Item Quantity Price", "Paper 10 4.50", "Toner 2 61.00"],
+        ["Signed copy follows", "", "Received in good order."],
+    ],
+    "receipt.png": [
+        ["CORNER MARKET", "Bread 2.40", "Milk 1.15", "Total 3.55"],
+    ],
+}
+# Pages rasterized to images with no text layer, as a scanner would produce them
+SCANNED_PAGES = {"scanned_letter.pdf": {0, 1}, "mixed.pdf": {1}}
+
+
+def _text_page(document, lines):
+    page = document.new_page(width=595, height=842)
+    rect = fitz.Rect(72, 72, 523, 770)
+    for i, line in enumerate(lines):
+        size = 18 if i == 0 else 11
+        height = page.insert_textbox(rect, line or " ", fontsize=size, fontname="helv")
+        rect.y0 += rect.height - height + (size * 0.6)
+    return page
+
+
+def _scan(page, dpi=150):
+    return page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+
+
+def build_document(name, pages):
+    scanned = SCANNED_PAGES.get(name, set())
+    document = fitz.open()
+    for page_num, lines in enumerate(pages):
+        if page_num not in scanned:
+            _text_page(document, lines)
+            continue
+        source = fitz.open()
+        pix = _scan(_text_page(source, lines))
+        page = document.new_page(width=595, height=842)
+        page.insert_image(page.rect, stream=pix.tobytes("png"))
+    if name.endswith(".png"):
+        return _scan(document[0]).tobytes("png")
+    return document.tobytes(garbage=4, deflate=True, no_new_id=True)
+
+
+def page_texts(pages):
+    return ["\n".join(line for line in lines if line) for lines in pages]
+
+
+def recorded_response(provider, text, page_num):
+    """A response in ``provider``'s wire format carrying ``text``."""
+    if provider == "Mistral":
+        return {"index": page_num, "markdown": text, "images": []}
+    if provider == "NVIDIA":
+        blocks = [{"type": "text", "text": paragraph} for paragraph in text.split("\n")]
+        return {"choices": [{"index": 0, "finish_reason": "tool_calls", "message": {
+            "role": "assistant", "tool_calls": [{"type": "function", "function": {
+                "name": "markdown_no_bbox", "arguments": json.dumps([blocks])}}]}}]}
+    return {"text": text}
+
+
+def main():
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    os.makedirs(RECORDINGS_DIR, exist_ok=True)
+    manifest = {"documents": []}
+    recordings = {provider: {"source": "synthetic", "documents": {}} for provider in NOMINAL_LATENCY}
+
+    for name, pages in DOCUMENTS.items():
+        data = build_document(name, pages)
+        with open(os.path.join(CORPUS_DIR, name), 'wb') as f:
+            f.write(data)
+        texts = page_texts(pages)
+        reference = os.path.splitext(name)[0] + ".txt"
+        with open(os.path.join(CORPUS_DIR, reference), 'w', encoding='utf-8') as f:
+            f.write("\n\n".join(texts) + "\n")
+        sha256 = hashlib.sha256(data).hexdigest()
+        manifest["documents"].append({"file": name, "sha256": sha256, "pages": len(pages),
+                                      "scanned_pages": sorted(SCANNED_PAGES.get(name, ())),
+                                      "reference": reference})
+        for provider, latency in NOMINAL_LATENCY.items():
+            recordings[provider]["documents"][sha256] = {
+                str(page_num): {"latency": latency, "response": recorded_response(provider, text, page_num)}
+                for page_num, text in enumerate(texts)
+            }
+
+    with open(os.path.join(CORPUS_DIR, "manifest.json"), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    for provider, recording in recordings.items():
+        with open(os.path.join(RECORDINGS_DIR, f"{provider.lower()}.json"), 'w', encoding='utf-8') as f:
+            json.dump(recording, f, indent=1)
+            f.write("\n")
+    print(f"Wrote {len(manifest['documents'])} documents to {CORPUS_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""Offline provider benchmark over the pinned corpus.
+
+Usage:
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --baseline baseline.json --tolerance 0.2
+    python -m benchmarks.run --providers Tesseract NVIDIA --latency-scale 1
+
+Every provider offered by ``process_file_ocr`` runs through the engine's
+``run_ocr`` over the documents listed in ``benchmarks/corpus/manifest.json``.
+Each file is checked against its pinned SHA-256 first. Cloud providers answer
+from recorded responses (see :mod:`benchmarks.standins`); recorded latency is
+only replayed with ``--latency-scale``, so by default the numbers measure this
+repository's own code. Each provider runs in a fresh process with caching
+disabled, which keeps the peak RSS per provider and stops one provider from
+warming another's document handles.
+
+The report holds, per provider:
+
+* per-page latency percentiles
+* throughput in pages per second
+* peak RSS
+* CER/WER against the reference transcripts
+
+Accuracy is only reported where the text came from a real engine or captured
+responses. The recordings ``make_corpus`` writes are synthetic and carry the
+reference text, so a cloud provider answering from them is reported as "not
+measured". The same goes for Cascade once it escalates a page: its escalations
+replay recordings keyed by pages of the full document, not of the cut-down
+document it sends.
+
+``--output`` writes it as JSON. With ``--baseline`` (an earlier JSON report),
+the run fails when a provider's p50 or p95 latency or its throughput is worse
+than the baseline by more than ``--tolerance``.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from constants import PROVIDERS
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "corpus")
+PDF_ONLY_PROVIDERS = {"PyMuPDF", "PyPDF2"}
+PERCENTILES = (50, 90, 95, 99)
+
+
+def load_corpus(corpus_dir=CORPUS_DIR):
+    """Read the manifest and its documents, refusing files that do not match their pinned hash."""
+    with open(os.path.join(corpus_dir, "manifest.json"), encoding='utf-8') as f:
+        manifest = json.load(f)
+    documents = []
+    for entry in manifest["documents"]:
+        with open(os.path.join(corpus_dir, entry["file"]), 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if digest != entry["sha256"]:
+            raise ValueError(f"{entry['file']} does not match the manifest (sha256 {digest})")
+        with open(os.path.join(corpus_dir, entry["reference"]), encoding='utf-8') as f:
+            reference = f.read()
+        documents.append(dict(entry, data=data, reference_text=reference))
+    return documents
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and its children in MiB, or None where unsupported."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def page_latencies(result, pages):
+    """Per-page seconds: the engine's page timings, or the total spread evenly when it has none."""
+    if len(result.page_timings) == pages:
+        return list(result.page_timings.values())
+    return [result.timings.get("total", 0.0) / pages] * pages
+
+
+def provider_available(provider):
+    """Return None when ``provider`` can be benchmarked here, else the reason it cannot."""
+    if provider == "Cascade":
+        from constants import CASCADE
+        provider = CASCADE["first"]
+    if provider == "Tesseract":
+        import pytesseract
+        if not shutil.which(pytesseract.pytesseract.tesseract_cmd):
+            return "tesseract binary not found"
+    return None
+
+
+def bench_provider(provider, documents, repeat, warmup, latency_scale):
+    """Benchmark one provider; runs in its own process."""
+    from app.core.accuracy import score_batch
+    from app.core.ocr_providers import EngineConfig, run_ocr
+    from benchmarks import standins
+
+    if provider == "Cascade":
+        # Escalations go to whichever cloud providers have recordings
+        recorded = [name for name in standins.PROVIDERS if standins.install(name, latency_scale)]
+    elif provider in standins.PROVIDERS:
+        if not standins.install(provider, latency_scale):
+            return {"skipped": "no recorded responses"}
+        recorded = [provider]
+    else:
+        recorded = []
+    reason = provider_available(provider)
+    if reason:
+        return {"skipped": reason}
+    not_measured = None
+    if provider in standins.PROVIDERS and standins.is_synthetic(provider):
+        not_measured = "synthetic recordings"
+
+    documents = [doc for doc in documents
+                 if provider not in PDF_ONLY_PROVIDERS or doc["file"].lower().endswith(".pdf")]
+    # Page-at-a-time stand-ins follow the page iterator, so cloud pages go one at a time
+    config = EngineConfig(use_cache=False, concurrency={name: 1 for name in PROVIDERS},
+                          api_keys={name: "recorded" for name in recorded})
+
+    latencies, errors, texts = [], [], {}
+    pages = 0
+    elapsed = 0.0
+    for iteration in range(warmup + repeat):
+        measured = iteration >= warmup
+        for doc in documents:
+            standins.start_document(doc["sha256"])
+            result = run_ocr(doc["data"], doc["file"], provider, config)
+            if not measured:
+                continue
+            if not result.ok:
+                errors.append({"file": doc["file"], "errors": result.errors or ["no text extracted"]})
+                continue
+            elapsed += result.timings.get("total", 0.0)
+            latencies.extend(page_latencies(result, doc["pages"]))
+            pages += doc["pages"]
+            texts[doc["file"]] = result.text
+            if result.cascade and result.cascade["escalated"]:
+                not_measured = "Cascade escalated pages to recorded responses"
+
+    report = {
+        "documents": len(documents),
+        "pages": pages,
+        "errors": errors,
+        "seconds": elapsed,
+        "throughput_pages_per_s": pages / elapsed if elapsed else None,
+        "latency_ms": ({f"p{q}": float(np.percentile(latencies, q)) * 1000 for q in PERCENTILES}
+                       | {"mean": float(np.mean(latencies)) * 1000}) if latencies else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    scored = [doc for doc in documents if doc["file"] in texts]
+    if not_measured:
+        report["accuracy"] = {"not_measured": not_measured}
+    elif scored:
+        per_document, total = score_batch((texts[doc["file"]], doc["reference_text"]) for doc in scored)
+        report["accuracy"] = total.to_dict()
+        report["accuracy"]["documents"] = {doc["file"]: result.to_dict()
+                                           for doc, result in zip(scored, per_document)}
+    return report
+
+
+def compare(report, baseline, tolerance, min_delta_ms):
+    """List the regressions of ``report`` against ``baseline``."""
+    regressions = []
+    for provider, current in report["providers"].items():
+        previous = baseline.get("providers", {}).get(provider)
+        if not previous or "skipped" in current or "skipped" in previous:
+            continue
+        for key in ("p50", "p95"):
+            new = (current.get("latency_ms") or {}).get(key)
+            old = (previous.get("latency_ms") or {}).get(key)
+            if new is not None and old is not None and new > old * (1 + tolerance) and new - old > min_delta_ms:
+                regressions.append(f"{provider}: {key} latency {new:.1f} ms vs baseline {old:.1f} ms")
+        new, old = current.get("throughput_pages_per_s"), previous.get("throughput_pages_per_s")
+        if new is not None and old is not None and new < old * (1 - tolerance):
+            regressions.append(f"{provider}: throughput {new:.1f} pages/s vs baseline {old:.1f} pages/s")
+        if current.get("errors") and not previous.get("errors"):
+            regressions.append(f"{provider}: {len(current['errors'])} documents failed")
+    return regressions
+
+
+def print_report(report):
+    print(f"{'provider':<10} {'pages':>5} {'p50 ms':>8} {'p95 ms':>8} {'pages/s':>8} {'RSS MiB':>8} "
+          f"{'CER':>7} {'WER':>7}")
+    for provider, result in report["providers"].items():
+        if "skipped" in result:
+            print(f"{provider:<10} skipped: {result['skipped']}")
+            continue
+        latency = result["latency_ms"] or {}
+        accuracy = result.get("accuracy") or {}
+
+        def fmt(value, spec):
+            return format(value, spec) if value is not None else format("-", ">" + spec.split(".")[0])
+        print(f"{provider:<10} {result['pages']:>5} {fmt(latency.get('p50'), '8.1f')} "
+              f"{fmt(latency.get('p95'), '8.1f')} {fmt(result['throughput_pages_per_s'], '8.1f')} "
+              f"{fmt(result['peak_rss_mb'], '8.1f')} {fmt(accuracy.get('cer'), '7.2%')} "
+              f"{fmt(accuracy.get('wer'), '7.2%')}")
+        if accuracy.get("not_measured"):
+            print(f"  accuracy not measured: {accuracy['not_measured']}")
+        for failure in result["errors"]:
+            print(f"  FAILED {failure['file']}: {failure['errors'][0]}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark OCR providers over the pinned corpus.")
+    parser.add_argument("--providers", nargs="+", choices=PROVIDERS, default=PROVIDERS)
+    parser.add_argument("--repeat", type=int, default=3, help="Measured passes over the corpus")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured passes before measuring")
+    parser.add_argument("--latency-scale", type=float, default=0.0,
+                        help="Replay recorded cloud latency scaled by this factor (0 = no waiting)")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="Earlier JSON report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative slowdown against the baseline")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0,
+                        help="Ignore latency regressions smaller than this many milliseconds")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        documents = load_corpus()
+    except (OSError, ValueError) as e:
+        print(f"Corpus check failed: {e}", file=sys.stderr)
+        return 2
+
+    report = {
+        "generated": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpu_count": os.cpu_count()},
+        "settings": {"repeat": args.repeat, "warmup": args.warmup, "latency_scale": args.latency_scale},
+        "corpus": {doc["file"]: doc["sha256"] for doc in documents},
+        "providers": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="ocr-bench-") as scratch:
+        # Checkpoints and extracted images go to scratch space, not the working tree
+        os.environ["OCR_CHECKPOINT_DIR"] = os.path.join(scratch, "checkpoints")
+        os.environ["OCR_IMAGE_DIR"] = os.path.join(scratch, "images")
+        os.environ["OCR_CACHE_DIR"] = os.path.join(scratch, "cache")
+        context = multiprocessing.get_context("spawn")
+        for provider in args.providers:
+            started = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                report["providers"][provider] = executor.submit(
+                    bench_provider, provider, documents, args.repeat, args.warmup, args.latency_scale).result()
+            logging.info(f"{provider} benchmarked in {time.perf_counter() - started:.1f}s")
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("Regressions against the baseline:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""Recorded-response stand-ins for the cloud providers.
+
+:func:`install` swaps the engine's Mistral client, Gemini model and NVIDIA
+HTTP transport for objects that answer from ``benchmarks/recordings/``, so
+that the rest of each provider's code runs unchanged. That covers PDF
+preparation, page rendering and encoding, response decoding and image
+extraction. Each recording maps a document's SHA-256 and a 0-based page to
+the provider's response and the latency it took, which can be replayed.
+
+Google and NVIDIA send one rendered page per request and the request does not
+say which page it is, so the stand-in follows the engine's page iterator. The
+harness therefore runs those providers with a concurrency of one.
+"""
+import json
+import os
+import time
+
+import requests
+
+import app.core.ocr_providers as engine
+
+RECORDINGS_DIR = os.path.join(os.path.dirname(__file__), "recordings")
+PROVIDERS = ("Mistral", "Google", "NVIDIA")
+
+
+class MissingRecording(LookupError):
+    """Raised when a request has no recorded response."""
+
+
+class _Current:
+    document = None
+    page = 0
+
+
+current = _Current()
+
+
+def load_recording(provider):
+    """Recording for ``provider``, or None when none exists."""
+    path = os.path.join(RECORDINGS_DIR, f"{provider.lower()}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class _Replay:
+    def __init__(self, recording, latency_scale):
+        self.documents = recording["documents"]
+        self.latency_scale = latency_scale
+
+    def page(self, page_num):
+        try:
+            entry = self.documents[current.document][str(page_num)]
+        except KeyError:
+            raise MissingRecording(f"no recording for page {page_num + 1} of {current.document}") from None
+        if self.latency_scale:
+            time.sleep(entry["latency"] * self.latency_scale)
+        return entry["response"]
+
+
+class _Response(dict):
+    def model_dump(self):
+        return dict(self)
+
+
+class _Namespace:
+    def __init__(self, **methods):
+        self.__dict__.update(methods)
+
+
+class MistralStandIn:
+    """Answers ``ocr.process`` from recorded pages; uploads are accepted and discarded."""
+
+    def __init__(self, replay):
+        self.replay = replay
+        uploaded = _Namespace(id="recorded-upload")
+        self.files = _Namespace(
+            upload=lambda **kwargs: uploaded,
+            get_signed_url=lambda **kwargs: _Namespace(url="recorded://document"),
+            delete=lambda **kwargs: None,
+        )
+        self.ocr = _Namespace(process=self._process)
+
+    def _process(self, model, document, pages=None):
+        return _Response(model=model, pages=[self.replay.page(page_num) for page_num in pages or [0]])
+
+
+class GoogleStandIn:
+    """Answers ``generate_content`` with the recorded text of the current page."""
+
+    def __init__(self, replay):
+        self.replay = replay
+
+    def generate_content(self, contents):
+        return _Namespace(text=self.replay.page(current.page)["text"])
+
+
+class _HTTPResponse:
+    def __init__(self, body):
+        self.content = json.dumps(body).encode()
+        self.text = self.content.decode()
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+
+class NVIDIAStandIn:
+    """HTTP transport answering chat completions with the current page's recorded body."""
+
+    def __init__(self, replay):
+        self.replay = replay
+
+    def post(self, url, headers=None, data=None, **kwargs):
+        try:
+            return _HTTPResponse(self.replay.page(current.page))
+        except MissingRecording as e:
+            raise requests.HTTPError(str(e)) from None
+
+
+def is_synthetic(provider):
+    """True when ``provider``'s recording was generated rather than captured from the service."""
+    recording = load_recording(provider)
+    return recording is not None and recording.get("source") == "synthetic"
+
+
+def install(provider, latency_scale=0.0):
+    """Route ``provider`` to its recording; returns False when there is none."""
+    recording = load_recording(provider)
+    if recording is None:
+        return False
+    replay = _Replay(recording, latency_scale)
+    original_iter_pdf_pages = engine.iter_pdf_pages
+
+    def iter_pdf_pages(file_bytes, *args, pages=None, **kwargs):
+        images = original_iter_pdf_pages(file_bytes, *args, pages=pages, **kwargs)
+        if pages is None:
+            yield from images
+            return
+        for page_num, image in zip(pages, images):
+            current.page = page_num
+            yield image
+
+    engine.iter_pdf_pages = iter_pdf_pages
+    if provider == "Mistral":
+        client = MistralStandIn(replay)
+    elif provider == "Google":
+        client = GoogleStandIn(replay)
+    else:
+        client = "recorded-api-key"
+        transport = NVIDIAStandIn(replay)
+        engine.get_transport = lambda name, settings=None: transport
+    original_get_client = engine.get_client
+    engine.get_client = lambda name, api_key=None: client if name == provider else original_get_client(name, api_key)
+    return True
+
+
+def start_document(sha256):
+    """Tell the stand-ins which corpus document the next requests belong to."""
+    current.document = sha256
+    current.page = 0
@@ -1,3 +1,5 @@
+import os
+
 OCR_MODELS = {
     "Mistral": "mistral-ocr-latest",
     "Google": "gemini-1.5-flash-latest",
@@ -5,6 +7,133 @@ OCR_MODELS = {
     "NVIDIA": "nvidia/nemotron-parse",
 }
 
+# Secret / environment variable holding each cloud provider's API key.
+API_KEY_NAMES = {
+    "Mistral": "MISTRAL_API_KEY",
+    "Google": "GEMINI_API_KEY",
+    "NVIDIA": "NVIDIA_API_KEY",
+}
+
+# Maximum number of pages sent to a provider at the same time. Cloud providers
+# are dominated by network wait, so a small pool cuts wall-clock time roughly
+# by the page count; local engines stay serial.
+PROVIDER_CONCURRENCY = {
+    "Google": 4,
+    "NVIDIA": 4,
+    "Tesseract": 1,
+}
+
+# Every provider offered by the app, batch CLI and benchmarks, in menu order.
+PROVIDERS = ("NVIDIA", "Mistral", "Google", "Tesseract", "PyMuPDF", "PyPDF2", "Cascade")
+# Engines that run on this machine; everything else is a network call.
+LOCAL_PROVIDERS = ("Tesseract", "PyMuPDF", "PyPDF2")
+
+# Worker processes used to shard Tesseract pages across cores.
+TESSERACT_WORKERS = int(os.environ.get("TESSERACT_WORKERS", os.cpu_count() or 1))
+# Read Tesseract pages with image_to_data to keep word boxes and confidences.
+TESSERACT_STRUCTURED = True
+# Extract PyMuPDF pages as layout (spans, fonts, boxes) rendered to markdown
+# with headings and tables, instead of plain text.
+PYMUPDF_STRUCTURED = True
+
+# HTTP transport for the NVIDIA endpoint: pooled keep-alive connections,
+# retries on 429/5xx with jittered backoff, and a client-side rate limit
+# (per process) so page bursts stay within the account quota.
+NVIDIA_TRANSPORT = {
+    "pool_size": 8,
+    "max_retries": 4,
+    "backoff_base": 1.0,
+    "backoff_max": 30.0,
+    "requests_per_minute": 40,
+    "burst": 4,
+    "timeout": 120,
+}
+
+# Image-based engines (Google, NVIDIA, Tesseract) can read born-digital PDF
+# pages from their text layer instead of rasterizing them, sending only pages
+# that look scanned or image-dominant to OCR. Off unless OCR_NATIVE_TEXT=1 or
+# switched on in the UI, since the text layer replaces the engine's own output.
+NATIVE_TEXT_ROUTING = os.environ.get("OCR_NATIVE_TEXT", "0") == "1"
+NATIVE_TEXT_ROUTER = {
+    "min_chars": 20,
+    "max_image_coverage": 0.5,
+    "max_bad_char_ratio": 0.05,
+}
+
+# Every page gets a quality score in [0, 1] as it comes out of the engine.
+# Pages scoring below PAGE_MIN_SCORE are flagged and, when PAGE_REOCR_PROVIDER
+# names a provider (e.g. "Mistral"), only those pages are OCR'd again with it.
+PAGE_MIN_SCORE = float(os.environ.get("OCR_PAGE_MIN_SCORE", 0.5))
+PAGE_REOCR_PROVIDER = os.environ.get("OCR_REOCR_PROVIDER") or None
+
+# "Cascade" mode: every page first goes to a local engine (Tesseract; with
+# NATIVE_TEXT_ROUTING on, digital pages are read from their text layer
+# instead), and only pages scoring below
+# min_score are escalated to the cloud providers in "escalate", in order,
+# while the document stays within max_cost (USD) and max_seconds. page_cost
+# and page_seconds are rough per-page estimates used to plan how many pages
+# fit in the budget; adjust them to your plan and region.
+CASCADE = {
+    "first": "Tesseract",
+    "escalate": ["NVIDIA", "Mistral", "Google"],
+    "min_score": PAGE_MIN_SCORE,
+    "max_cost": float(os.environ.get("OCR_CASCADE_MAX_COST", 0.05)),
+    "max_seconds": float(os.environ.get("OCR_CASCADE_MAX_SECONDS", 120)),
+    "page_cost": {"NVIDIA": 0.002, "Mistral": 0.001, "Google": 0.0005},
+    "page_seconds": {"NVIDIA": 2.0, "Mistral": 1.5, "Google": 3.0},
+}
+
+# Mistral documents up to this size are sent inline as a base64 data URL (and
+# JPEG/PNG/WebP images as an image URL, without converting them to PDF),
+# saving the upload and signed-URL round trips. Larger files, and PDFs longer
+# than one chunk (each chunk is its own request), are uploaded once instead.
+MISTRAL_INLINE_MAX_BYTES = 4 * 1024 * 1024
+
+# Threads decoding and writing the images embedded in an OCR response.
+IMAGE_WRITE_WORKERS = 4
+
+# Content-addressed store for extracted images: a shared local directory, or
+# an S3-compatible bucket when OCR_IMAGE_BUCKET is set (requires boto3).
+IMAGE_STORE_DIR = os.environ.get("OCR_IMAGE_DIR", os.path.join(os.getcwd(), ".ocr_images"))
+IMAGE_STORE_MAX_BYTES = int(os.environ.get("OCR_IMAGE_MAX_BYTES", 1024 * 1024 * 1024))
+IMAGE_STORE_S3_BUCKET = os.environ.get("OCR_IMAGE_BUCKET")
+IMAGE_STORE_S3_PREFIX = os.environ.get("OCR_IMAGE_PREFIX", "ocr-images/")
+
+# Memory budget (estimated) for parsed PDFs kept open and shared between the
+# preview, page routing, rendering and visualization.
+DOCUMENT_HANDLE_CACHE_BYTES = int(os.environ.get("DOCUMENT_HANDLE_CACHE_BYTES", 256 * 1024 * 1024))
+
+# Rendered preview pages kept in memory (encoded PNG bytes), the zoom of the
+# placeholder thumbnail shown while a page renders, and how many pages on each
+# side of the current one are rendered ahead in the background.
+PREVIEW_CACHE_BYTES = int(os.environ.get("PREVIEW_CACHE_BYTES", 128 * 1024 * 1024))
+PREVIEW_THUMBNAIL_ZOOM = 0.35
+PREVIEW_PREFETCH_PAGES = 2
+
+# Rasterization settings for PDF pages sent to image-based engines.
+PDF_RENDER_DPI = 72
+PDF_RENDER_COLORSPACE = "rgb"
+
+# How page images are encoded for the NVIDIA endpoint. Each page is encoded
+# once in this format (JPEG is several times smaller than PNG for scans) and
+# pages whose longer side exceeds max_side pixels are downscaled first.
+NVIDIA_IMAGE = {
+    "dpi": PDF_RENDER_DPI,
+    "format": "JPEG",
+    "quality": 90,
+    "max_side": 2048,
+}
+
+# Large documents are processed in windows of this many pages; each finished
+# window is checkpointed so an interrupted run resumes where it stopped.
+PDF_CHUNK_PAGES = 10
+CHECKPOINT_DIR = os.environ.get("OCR_CHECKPOINT_DIR", os.path.join(os.getcwd(), ".ocr_checkpoints"))
+
+# Persistent OCR result cache shared by all sessions and processes on the host.
+OCR_CACHE_DIR = os.environ.get("OCR_CACHE_DIR", os.path.join(os.getcwd(), ".ocr_cache"))
+OCR_CACHE_MAX_BYTES = int(os.environ.get("OCR_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+OCR_CACHE_TTL_SECONDS = int(os.environ.get("OCR_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+
 OCR_METRICS = {
     "text_quality": {
         "good": 0.8,
@@ -54,6 +183,11 @@ OCR_PERFORMANCE_METRICS = {
             "ideal_for": ["Complex layouts", "Noisy images", "Structured data"],
             "strengths": ["High accuracy", "Layout parsing", "Bounding box detection"],
             "base_conf": 0.90
+        },
+        "Cascade": {
+            "ideal_for": ["Mostly clean documents", "Large batches", "Cost control"],
+            "strengths": ["Local first", "Cloud only for weak pages", "Budget caps"],
+            "base_conf": 0.85
         }
     },
     "weights": {
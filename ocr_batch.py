@@ -0,0 +1,213 @@
+"""Headless batch OCR over directories or glob patterns.
+
+Usage:
+    python ocr_batch.py scans/ --provider Tesseract --output-dir out/
+    python ocr_batch.py "inbox/**/*.pdf" --provider NVIDIA --concurrency 8
+
+Local engines (Tesseract, PyMuPDF, PyPDF2) are spread across a process pool;
+cloud providers run on a bounded asyncio pool since they mostly wait on the
+network; ``--concurrency`` caps the documents in flight. Mistral uses the
+SDK's async client, so the upload of one document overlaps OCR of the others.
+Each document produces ``<name>.md`` plus ``<name>.metrics.json``. With
+``--references DIR``, outputs are scored against ground-truth transcripts laid
+out like the inputs (``DIR/<name>.txt``) and the summary gains CER/WER. With
+``--native-text``, born-digital PDF pages are read from their text layer and
+only scanned pages go to the provider. API keys
+are read from the environment (MISTRAL_API_KEY, GEMINI_API_KEY,
+NVIDIA_API_KEY).
+"""
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from app.core.accuracy import score_batch
+from app.core.ocr_providers import EngineConfig, run_ocr, run_ocr_async
+from constants import LOCAL_PROVIDERS, NATIVE_TEXT_ROUTING, PROVIDERS
+from ocr_evaluation import evaluate_ocr_quality
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.webp')
+
+
+def collect_inputs(inputs):
+    """Expand directories (recursively) and glob patterns into a sorted file list."""
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for dirpath, _, filenames in os.walk(item):
+                files.update(os.path.join(dirpath, f) for f in filenames)
+        else:
+            files.update(glob.glob(item, recursive=True))
+    return sorted(f for f in files if os.path.isfile(f) and f.lower().endswith(SUPPORTED_EXTENSIONS))
+
+
+def output_stem(path, root, output_dir):
+    """Mirror the input layout under ``output_dir`` so equal file names do not collide."""
+    relative = os.path.relpath(path, root) if root else os.path.basename(path)
+    return os.path.join(output_dir, os.path.splitext(relative)[0])
+
+
+def read_document(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def process_document(path, provider, stem, config=None):
+    """OCR one file and write its markdown and metrics; returns a summary dict."""
+    try:
+        file_bytes = read_document(path)
+    except OSError as e:
+        return {"file": path, "provider": provider, "error": str(e)}
+    return write_outputs(path, provider, stem, run_ocr(file_bytes, os.path.basename(path), provider, config))
+
+
+async def process_document_async(path, provider, stem, config=None):
+    """Awaitable :func:`process_document`; file I/O runs in worker threads."""
+    try:
+        file_bytes = await asyncio.to_thread(read_document, path)
+    except OSError as e:
+        return {"file": path, "provider": provider, "error": str(e)}
+    result = await run_ocr_async(file_bytes, os.path.basename(path), provider, config)
+    return await asyncio.to_thread(write_outputs, path, provider, stem, result)
+
+
+def write_outputs(path, provider, stem, result):
+    """Write a document's markdown and metrics; returns its summary dict."""
+    summary = {
+        "file": path,
+        "provider": provider,
+        "model": result.model,
+        "from_cache": result.from_cache,
+        "timings": result.timings,
+    }
+    if result.errors:
+        summary["errors"] = result.errors
+    if not result.ok:
+        summary["error"] = result.errors[0] if result.errors else "no text extracted"
+        return summary
+
+    quality_score, metrics = evaluate_ocr_quality(result.text, provider,
+                                                  metadata={"confidence": result.mean_confidence(),
+                                                            "layout": result.layout_stats()})
+    summary.update({"quality_score": quality_score, "metrics": metrics, "pages": result.page_summary(),
+                    "output": f"{stem}.md"})
+    if result.cascade:
+        summary["cascade"] = result.cascade
+
+    os.makedirs(os.path.dirname(stem) or ".", exist_ok=True)
+    with open(f"{stem}.md", 'w', encoding='utf-8') as f:
+        f.write(result.text)
+    with open(f"{stem}.metrics.json", 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def run_local(jobs, provider, workers, config):
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(process_document, path, provider, stem, config) for path, stem in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+async def _run_cloud(jobs, provider, concurrency, config, on_done):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(path, stem):
+        async with semaphore:
+            on_done(await process_document_async(path, provider, stem, config))
+
+    await asyncio.gather(*(run_one(path, stem) for path, stem in jobs))
+
+
+def run_cloud(jobs, provider, concurrency, config):
+    summaries = []
+    asyncio.run(_run_cloud(jobs, provider, concurrency, config, summaries.append))
+    return summaries
+
+
+def score_references(summaries, output_dir, reference_dir, workers):
+    """Add CER/WER against ``reference_dir`` transcripts to successful summaries; returns the totals."""
+    scored, pairs = [], []
+    for summary in summaries:
+        if "error" in summary:
+            continue
+        relative = os.path.relpath(os.path.splitext(summary["output"])[0], output_dir)
+        reference_path = os.path.join(reference_dir, f"{relative}.txt")
+        if not os.path.isfile(reference_path):
+            continue
+        with open(summary["output"], encoding='utf-8') as f:
+            hypothesis = f.read()
+        with open(reference_path, encoding='utf-8') as f:
+            pairs.append((hypothesis, f.read()))
+        scored.append(summary)
+    if not pairs:
+        return None
+    results, total = score_batch(pairs, max_workers=workers)
+    for summary, result in zip(scored, results):
+        summary["accuracy"] = result.to_dict()
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk OCR over directories or glob patterns.")
+    parser.add_argument("inputs", nargs="+", help="Directories or glob patterns of PDFs/images")
+    parser.add_argument("--provider", choices=PROVIDERS, default="Tesseract")
+    parser.add_argument("--output-dir", default="ocr_output")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Process pool size for local engines")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Documents in flight at once for cloud providers")
+    parser.add_argument("--skip-existing", action="store_true",
+                        help="Skip files whose markdown output already exists")
+    parser.add_argument("--references", metavar="DIR",
+                        help="Score outputs against ground-truth DIR/<name>.txt transcripts (CER/WER)")
+    parser.add_argument("--native-text", action="store_true", default=NATIVE_TEXT_ROUTING,
+                        help="Read born-digital PDF pages from their text layer instead of OCR")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    # Documents are already spread across processes here, so Tesseract must not
+    # also shard each document's pages across every core
+    config = EngineConfig(tesseract_workers=1, native_routing=args.native_text)
+
+    files = collect_inputs(args.inputs)
+    if not files:
+        print("No supported files found", file=sys.stderr)
+        return 2
+
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in files])
+    jobs = [(f, output_stem(os.path.abspath(f), root, args.output_dir)) for f in files]
+    if args.skip_existing:
+        jobs = [(f, stem) for f, stem in jobs if not os.path.exists(f"{stem}.md")]
+    logging.info(f"{len(jobs)} of {len(files)} documents to process with {args.provider}")
+
+    started = time.perf_counter()
+    if args.provider in LOCAL_PROVIDERS:
+        summaries = list(run_local(jobs, args.provider, args.workers, config))
+    else:
+        summaries = run_cloud(jobs, args.provider, args.concurrency, config)
+    elapsed = time.perf_counter() - started
+    accuracy = score_references(summaries, args.output_dir, args.references, args.workers) if args.references else None
+
+    failures = [s for s in summaries if "error" in s]
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(os.path.join(args.output_dir, "summary.jsonl"), 'a', encoding='utf-8') as f:
+        for summary in summaries:
+            f.write(json.dumps(summary) + "\n")
+
+    print(f"Processed {len(summaries)} documents in {elapsed:.1f}s, {len(failures)} failed")
+    if accuracy:
+        print(f"Accuracy over {sum('accuracy' in s for s in summaries)} referenced documents: "
+              f"CER {accuracy.cer:.2%}, WER {accuracy.wer:.2%}")
+    for summary in failures:
+        print(f"  FAILED {summary['file']}: {summary['error']}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,12 @@
+import re
+
+from app.core.accuracy import score
+from app.core.metrics import text_stats
 from constants import OCR_METRICS, OCR_PERFORMANCE_METRICS
 
+# Searched case-insensitively in place, instead of lowercasing a copy of the text per tag
+_TABLE = re.compile("table", re.IGNORECASE)
+
 def clamp(val, minval=0.0, maxval=1.0):
     return max(minval, min(maxval, val))
 
@@ -17,11 +24,12 @@ def evaluate_ocr_quality(text, provider, metadata=None):
             "format_retention": 0.0
         }
 
+    stats = text_stats(text)
     metrics = {
-        "word_count": len(text.split()),
-        "line_count": len(text.splitlines()),
-        "char_count": len(text),
-        "avg_line_length": len(text) / max(len(text.splitlines()), 1),
+        "word_count": stats.words,
+        "line_count": stats.lines,
+        "char_count": stats.chars,
+        "avg_line_length": stats.avg_line_length,
         "confidence_score": OCR_PERFORMANCE_METRICS["providers"].get(provider, {}).get("base_conf", 0.5),
         "structure_score": 0.0,
         "format_retention": 0.0
@@ -29,15 +37,19 @@ def evaluate_ocr_quality(text, provider, metadata=None):
 
     # Use metadata if available (e.g., expected language, page count)
     if metadata:
+        # Measured engine confidence (e.g. Tesseract word confidences) beats the provider prior
+        if metadata.get("confidence") is not None:
+            metrics["confidence_score"] = float(metadata["confidence"])
+
         # Example: adjust confidence if language mismatch
         expected_lang = metadata.get("language")
-        if expected_lang and expected_lang.lower() not in text.lower():
+        if expected_lang and not re.search(re.escape(expected_lang), text, re.IGNORECASE):
             metrics["confidence_score"] *= 0.8  # penalize if expected language not found
 
     # Provider-specific heuristics (can be refactored to use OCR_METRICS for extensibility)
     provider_logic = {
         "Mistral": {
-            "structure_score": 0.9 if any(tag in text.lower() for tag in ["#", "##", "table", "---"]) else 0.7,
+            "structure_score": 0.9 if "#" in text or "---" in text or _TABLE.search(text) else 0.7,
             "format_retention": 0.9 if "```" in text or "*" in text else 0.6
         },
         "Google": {
@@ -45,7 +57,7 @@ def evaluate_ocr_quality(text, provider, metadata=None):
             "format_retention": 0.8 if metrics["line_count"] > 5 else 0.6
         },
         "NVIDIA": {
-            "structure_score": 0.95 if any(tag in text.lower() for tag in ["#", "##", "table", "-"]) else 0.75,
+            "structure_score": 0.95 if "#" in text or "-" in text or _TABLE.search(text) else 0.75,
             "format_retention": 0.9 if any(marker in text for marker in ["```", "*", ">", "- "]) else 0.7
         },
         "Tesseract": {
@@ -71,6 +83,11 @@ def evaluate_ocr_quality(text, provider, metadata=None):
         metrics["structure_score"] = 0.5
         metrics["format_retention"] = 0.5
 
+    # Measured layout (PyMuPDF structured mode) beats the provider prior
+    layout = metadata.get("layout") if metadata else None
+    if layout:
+        metrics["structure_score"] = 0.7 + 0.15 * bool(layout.get("headings")) + 0.15 * bool(layout.get("tables"))
+
     # Clamp all scores to [0, 1]
     for k in ["confidence_score", "structure_score", "format_retention"]:
         metrics[k] = clamp(metrics[k])
@@ -86,4 +103,11 @@ def evaluate_ocr_quality(text, provider, metadata=None):
     # Clamp final quality score
     quality_score = clamp(quality_score)
 
+    # A ground-truth transcript replaces the heuristics with measured accuracy
+    reference = metadata.get("reference") if metadata else None
+    if reference is not None:
+        accuracy = score(text, reference)
+        metrics.update(cer=accuracy.cer, wer=accuracy.wer)
+        quality_score = clamp(1.0 - accuracy.cer)
+
     return quality_score, metrics
\ No newline at end of file
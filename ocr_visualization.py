@@ -2,7 +2,8 @@ import streamlit as st
 import pandas as pd
 import io
 from PIL import Image, ImageDraw
-import fitz
+from app.core.doc_handles import open_document
+from app.core.layout import PageLayout
 from constants import OCR_PERFORMANCE_METRICS
 
 def visualize_ocr_comparison(results):
@@ -64,7 +65,8 @@ def visualize_ocr_results(page_image, parsed_elements):
             'text': '#00FF00',
             'table': '#0000FF',
             'image': '#FF0000',
-            'heading': '#FFA500'
+            'heading': '#FFA500',
+            'low_confidence': '#FF00FF'
         }
         
         for element in parsed_elements:
@@ -78,45 +80,32 @@ def visualize_ocr_results(page_image, parsed_elements):
         st.error(f"Error visualizing OCR results: {str(e)}")
         return None
 
-def visualize_provider_parsing(provider, file_bytes, file_name, page_num=1):
-    """Generate provider-specific parsing visualization"""
+ELEMENT_STYLES = {
+    "heading": ("#FFA500", "Heading"),
+    "table": ("#0000FF", "Table"),
+    "text": ("#00FF00", "Text"),
+    "image": ("#FF0000", "Image"),
+}
+
+def visualize_provider_parsing(provider, file_bytes, file_name, page_num=1, layout=None):
+    """Generate provider-specific parsing visualization
+
+    ``layout`` is the page's PageLayout when a structured PyMuPDF run already
+    produced it; otherwise the page is read once here.
+    """
     try:
-        pdf_doc = fitz.open(stream=file_bytes)
-        page = pdf_doc[page_num-1]
+        if layout is None:
+            with open_document(file_bytes) as pdf_doc:
+                layout = PageLayout.from_page(pdf_doc[page_num - 1])
+
         elements = []
-        
-        # Get text blocks with provider-specific handling
-        blocks = page.get_text("dict")["blocks"]
-        
-        for block in blocks:
-            if block.get("type") == 0:  # Text
-                if provider in ["Mistral", "Google"]:
-                    first_line = block["lines"][0] if block.get("lines") else None
-                    is_heading = first_line and any(span["size"] > 12 for span in first_line["spans"])
-                    
-                    elements.append({
-                        "type": "heading" if is_heading else "text",
-                        "bbox": block["bbox"],
-                        "color": "#FFA500" if is_heading else "#00FF00",
-                        "label": "Heading" if is_heading else "Text"
-                    })
-                else:
-                    elements.append({
-                        "type": "text",
-                        "bbox": block["bbox"],
-                        "color": "#00FF00",
-                        "label": "Text"
-                    })
-            
-            elif block.get("type") == 1:  # Image
-                elements.append({
-                    "type": "image",
-                    "bbox": block["bbox"],
-                    "color": "#FF0000",
-                    "label": "Image"
-                })
-                
-        pdf_doc.close()
+        for element in layout.to_elements():
+            element_type = element["type"]
+            # Only layout-aware providers get heading and table distinctions
+            if element_type in ("heading", "table") and provider not in ["Mistral", "Google"]:
+                element_type = "text"
+            color, label = ELEMENT_STYLES[element_type]
+            elements.append({"type": element_type, "bbox": element["bbox"], "color": color, "label": label})
         return elements
         
     except Exception as e:
@@ -126,7 +115,7 @@ def visualize_provider_parsing(provider, file_bytes, file_name, page_num=1):
 def draw_parsing_visualization(file_bytes, page_num, elements):
     """Draw parsing visualization on page image"""
     try:
-        with fitz.open(stream=file_bytes) as pdf_doc:
+        with open_document(file_bytes) as pdf_doc:
             page = pdf_doc[page_num - 1]
             pix = page.get_pixmap()
             img = Image.open(io.BytesIO(pix.tobytes("png")))
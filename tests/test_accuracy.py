@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+import app.core.accuracy as accuracy
+from app.core.accuracy import _myers, levenshtein
+
+
+def dp_levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def random_pairs(count, alphabet="abcd ", max_length=150):
+    rng = random.Random(0)
+    for _ in range(count):
+        a = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, max_length)))
+        b = list(a)
+        for _ in range(rng.randint(0, 20)):
+            position = rng.randint(0, len(b))
+            edit = rng.choice(("insert", "delete", "replace"))
+            if edit == "insert" or not b:
+                b.insert(position, rng.choice(alphabet))
+            elif edit == "delete":
+                del b[min(position, len(b) - 1)]
+            else:
+                b[min(position, len(b) - 1)] = rng.choice(alphabet)
+        yield a, "".join(b)
+
+
+@pytest.fixture(params=["installed", "fallback"])
+def backend(request, monkeypatch):
+    if request.param == "installed" and accuracy._rapidfuzz_levenshtein is None:
+        pytest.skip("rapidfuzz is not installed")
+    if request.param == "fallback":
+        monkeypatch.setattr(accuracy, "_rapidfuzz_levenshtein", None)
+
+
+@pytest.mark.parametrize("a, b", list(random_pairs(200)))
+def test_levenshtein_matches_dp(backend, a, b):
+    expected = dp_levenshtein(a, b)
+    assert levenshtein(a, b) == expected
+    assert levenshtein(b, a) == expected
+
+
+def test_myers_matches_dp_beyond_one_word():
+    # Unrelated strings longer than 64 characters exercise carries between words
+    rng = random.Random(1)
+    for _ in range(20):
+        a = "".join(rng.choice("xyz") for _ in range(rng.randint(65, 300)))
+        b = "".join(rng.choice("xyz") for _ in range(rng.randint(0, 300)))
+        assert _myers(a, b) == dp_levenshtein(a, b)
@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+import app.core.ocr_providers as engine
+import app.core.pipeline as pipeline
+from app.core.ocr_providers import EngineConfig, _Run, run_ocr
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "corpus")
+
+
+@pytest.fixture
+def report_pdf(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "CHECKPOINT_DIR", str(tmp_path))
+    with open(os.path.join(CORPUS, "digital_report.pdf"), "rb") as f:
+        return f.read()
+
+
+def test_resume_after_crash_ignores_chunks_from_other_output_settings(report_pdf, monkeypatch):
+    record_page = _Run.record_page
+
+    def crash_on_third_page(run, page_num, text):
+        if page_num == 2:
+            raise RuntimeError("crashed")
+        record_page(run, page_num, text)
+
+    monkeypatch.setattr(_Run, "record_page", crash_on_third_page)
+    crashed = run_ocr(report_pdf, "report.pdf", "PyMuPDF",
+                      EngineConfig(use_cache=False, chunk_pages=2, pymupdf_structured=False))
+    assert not crashed.ok
+    monkeypatch.setattr(_Run, "record_page", record_page)
+
+    resumed = run_ocr(report_pdf, "report.pdf", "PyMuPDF",
+                      EngineConfig(use_cache=False, chunk_pages=2, pymupdf_structured=True))
+    assert resumed.ok
+    assert sorted(resumed.page_layouts) == [0, 1, 2, 3]
+
+
+def test_resume_replays_checkpointed_chunks_with_the_same_settings(report_pdf, monkeypatch):
+    config = EngineConfig(use_cache=False, chunk_pages=2, pymupdf_structured=True)
+    record_page = _Run.record_page
+    calls = []
+
+    def crash_on_third_page(run, page_num, text):
+        calls.append(page_num)
+        if page_num == 2:
+            raise RuntimeError("crashed")
+        record_page(run, page_num, text)
+
+    monkeypatch.setattr(_Run, "record_page", crash_on_third_page)
+    assert not run_ocr(report_pdf, "report.pdf", "PyMuPDF", config).ok
+    monkeypatch.setattr(_Run, "record_page", lambda run, page_num, text: (calls.append(page_num),
+                                                                           record_page(run, page_num, text)))
+    calls.clear()
+    resumed = run_ocr(report_pdf, "report.pdf", "PyMuPDF", config)
+    assert resumed.ok
+    # Pages 0-1 are replayed from the checkpoint; only the unfinished chunk is processed again
+    assert calls == [0, 1, 2, 3]
+    assert sorted(resumed.page_layouts) == [0, 1, 2, 3]